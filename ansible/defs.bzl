@@ -5,19 +5,31 @@ load(
     "//private:ansible.bzl",
     _ansible_playbook = "ansible_playbook",
 )
+load(
+    "//private:config.bzl",
+    _AnsibleConfigInfo = "AnsibleConfigInfo",
+    _ansible_config = "ansible_config",
+)
 load(
     "//private:lint.bzl",
     _ansible_lint_aspect = "ansible_lint_aspect",
     _ansible_lint_test = "ansible_lint_test",
 )
+load(
+    "//private:syntax_check.bzl",
+    _ansible_syntax_check_aspect = "ansible_syntax_check_aspect",
+)
 load(
     ":toolchain.bzl",
     _ansible_toolchain = "ansible_toolchain",
     _current_ansible_toolchain = "current_ansible_toolchain",
 )
 
+AnsibleConfigInfo = _AnsibleConfigInfo
+ansible_config = _ansible_config
 ansible_lint_aspect = _ansible_lint_aspect
 ansible_lint_test = _ansible_lint_test
 ansible_playbook = _ansible_playbook
+ansible_syntax_check_aspect = _ansible_syntax_check_aspect
 ansible_toolchain = _ansible_toolchain
 current_ansible_toolchain = _current_ansible_toolchain
@@ -0,0 +1,54 @@
+"""# Bzlmod extensions
+
+```python
+ansible = use_extension("@rules_ansible//ansible:extensions.bzl", "ansible")
+ansible.collections(
+    name = "ansible_collections",
+    requirements = "//:requirements.yml",
+    mirror = "third_party/ansible_collections",
+)
+use_repo(ansible, "ansible_collections")
+```
+"""
+
+load("//private:galaxy.bzl", "ansible_galaxy_collections_repository")
+
+_COLLECTIONS_TAG = tag_class(
+    doc = "Vendor pinned Ansible Galaxy collections from local archives into a repository.",
+    attrs = {
+        "mirror": attr.string(
+            doc = (
+                "A local directory containing `<namespace>-<name>-<version>.tar.gz` collection " +
+                "archives. Relative paths are resolved against the directory of `requirements`."
+            ),
+        ),
+        "name": attr.string(
+            doc = "The name of the repository to create.",
+            mandatory = True,
+        ),
+        "requirements": attr.label(
+            doc = (
+                "An `ansible-galaxy` `requirements.yml` file. Entries must either be pinned " +
+                "to an exact version available in `mirror` or be `type: file` sources."
+            ),
+            mandatory = True,
+        ),
+    },
+)
+
+def _ansible_impl(module_ctx):
+    for mod in module_ctx.modules:
+        for attrs in mod.tags.collections:
+            ansible_galaxy_collections_repository(
+                name = attrs.name,
+                requirements = attrs.requirements,
+                mirror = attrs.mirror,
+            )
+
+ansible = module_extension(
+    doc = "Module extensions for Ansible dependencies.",
+    implementation = _ansible_impl,
+    tag_classes = {
+        "collections": _COLLECTIONS_TAG,
+    },
+)
@@ -2,11 +2,52 @@
 
 load("@rules_venv//python:py_info.bzl", "PyInfo")
 
+def _collections_roots(files):
+    """Locate the directories which contain `ansible_collections` trees.
+
+    Args:
+        files (list[File]): Files within `ansible_collections` directories.
+
+    Returns:
+        list[struct]: `File`-like structs with `path` and `short_path` fields
+        for each directory suitable for `ANSIBLE_COLLECTIONS_PATH`.
+    """
+    roots = {}
+    for file in files:
+        # Source files are owned by a label whose name is the package relative path.
+        relative = file.owner.name
+        if relative.startswith("ansible_collections/"):
+            idx = 0
+        else:
+            idx = relative.find("/ansible_collections/")
+            if idx < 0:
+                fail("{} is not within an `ansible_collections` directory".format(file.owner))
+            idx += 1
+
+        suffix_len = len(relative) - idx + 1
+        path = file.path[:-suffix_len] or "."
+        if path in roots:
+            continue
+
+        roots[path] = struct(
+            path = path,
+            short_path = file.short_path[:-suffix_len],
+        )
+
+    return roots.values()
+
 def _ansible_toolchain_impl(ctx):
     return platform_common.ToolchainInfo(
         ansible = ctx.attr.ansible,
         ansible_core = ctx.attr.ansible_core,
         ansible_lint = ctx.attr.ansible_lint,
+        collections = depset(ctx.files.collections),
+        collections_roots = _collections_roots(ctx.files.collections),
+        connection = ctx.attr.connection,
+        connection_plugins = ctx.files.connection_plugins,
+        plugin_deps = ctx.attr.plugin_deps,
+        strategy = ctx.attr.strategy,
+        strategy_plugins = ctx.files.strategy_plugins,
     )
 
 ansible_toolchain = rule(
@@ -28,6 +69,47 @@ ansible_toolchain = rule(
             mandatory = True,
             providers = [PyInfo],
         ),
+        "collections": attr.label_list(
+            doc = (
+                "Files of vendored Ansible collections. Files must be within an `ansible_collections` " +
+                "directory whose parent is searched before the `collections_path` configured " +
+                "by the environment or `ansible.cfg`. See the " +
+                "`collections` tag of the `ansible` module extension."
+            ),
+            allow_files = True,
+        ),
+        "connection": attr.string(
+            doc = (
+                "The default connection plugin to use (`ANSIBLE_TRANSPORT`). E.g. a pipelined " +
+                "connection provided by `connection_plugins`. Only used when neither the " +
+                "environment nor the playbook's `ansible.cfg` sets `transport`."
+            ),
+        ),
+        "connection_plugins": attr.label_list(
+            doc = (
+                "Connection plugin sources. Their directories are searched before the " +
+                "`connection_plugins` configured by the environment or `ansible.cfg`."
+            ),
+            allow_files = [".py"],
+        ),
+        "plugin_deps": attr.label_list(
+            doc = "`py_library` targets required by `strategy_plugins` or `connection_plugins`.",
+            providers = [PyInfo],
+        ),
+        "strategy": attr.string(
+            doc = (
+                "The default strategy plugin to use (`ANSIBLE_STRATEGY`). E.g. `mitogen_linear` " +
+                "for a mitogen strategy provided by `strategy_plugins`. Only used when neither " +
+                "the environment nor the playbook's `ansible.cfg` sets `strategy`."
+            ),
+        ),
+        "strategy_plugins": attr.label_list(
+            doc = (
+                "Strategy plugin sources. Their directories are searched before the " +
+                "`strategy_plugins` configured by the environment or `ansible.cfg`."
+            ),
+            allow_files = [".py"],
+        ),
     },
 )
 
@@ -7,6 +7,7 @@ load(
     "generate_process_wrapper",
     "get_process_wrapper_attr",
 )
+load(":config.bzl", "AnsibleConfigInfo")
 
 AnsiblePlaybookInfo = provider(
     doc = "Infomation describing components of an Ansible playbook.",
@@ -143,34 +144,66 @@ def _rlocationpath(file, workspace_name):
 
 def _ansible_playbook_impl(ctx):
     venv_toolchain = py_venv_common.get_toolchain(ctx)
+    ansible_toolchain = ctx.toolchains[Label("//ansible:toolchain_type")]
     hosts_file = _copy_inventory_action(ctx, ctx.file.hosts)
     inventory_files = [_copy_inventory_action(ctx, file) for file in ctx.files.inventory]
     role_files = [_copy_action(ctx, file) for file in ctx.files.roles]
     playbook = _copy_action(ctx, ctx.file.playbook)
     config = _copy_action(ctx, ctx.file.config)
 
+    forks = ""
+    if AnsibleConfigInfo in ctx.attr.config and ctx.attr.config[AnsibleConfigInfo].forks == -1:
+        forks = "auto"
+
     # Create copies of all vault files to allow for them to be decrypted at
     # runtime without ever litering the repo with decrypted files
     vault_files = [_vault_copy_action(ctx, file) for file in ctx.files.vault]
 
+    # All settings of the launcher are written to a single manifest so they can be
+    # loaded at runtime with one file read. Files staged by this rule are recorded
+    # relative to the manifest and require no runfiles lookups.
+    manifest = ctx.actions.declare_file("{}.ansible/ansible_launch.json".format(ctx.label.name))
+    staging_dir = manifest.short_path[:-len(manifest.basename)]
+
+    def _staged_path(file):
+        return file.short_path[len(staging_dir):]
+
+    ctx.actions.write(
+        output = manifest,
+        content = json.encode_indent({
+            "args": getattr(ctx.attr, "args", []),
+            "collections": [_rlocationpath(root, ctx.workspace_name) for root in ansible_toolchain.collections_roots],
+            "config": _staged_path(config),
+            "connection": ansible_toolchain.connection,
+            "connection_plugins": [_rlocationpath(file, ctx.workspace_name) for file in ansible_toolchain.connection_plugins],
+            "forks": forks,
+            "inventory_hosts": _staged_path(hosts_file),
+            "launcher_name": ctx.label.name,
+            "package": ctx.label.package,
+            "playbook": _staged_path(playbook),
+            "strategy": ansible_toolchain.strategy,
+            "strategy_plugins": [_rlocationpath(file, ctx.workspace_name) for file in ansible_toolchain.strategy_plugins],
+            "vault_files": [_staged_path(file) for file in vault_files],
+        }, indent = " " * 4) + "\n",
+    )
+
     env = {
-        "ANSIBLE_BZL_ARGS": json.encode(getattr(ctx.attr, "args", [])),
-        "ANSIBLE_BZL_CONFIG": _rlocationpath(config, ctx.workspace_name),
-        "ANSIBLE_BZL_INVENTORY_HOSTS": _rlocationpath(hosts_file, ctx.workspace_name),
-        "ANSIBLE_BZL_LAUNCHER_NAME": ctx.label.name,
-        "ANSIBLE_BZL_PACKAGE": ctx.label.package,
-        "ANSIBLE_BZL_PLAYBOOK": _rlocationpath(playbook, ctx.workspace_name),
-        "ANSIBLE_BZL_VAULT_FILES": json.encode([_rlocationpath(file, ctx.workspace_name) for file in vault_files]),
+        "ANSIBLE_BZL_LAUNCH_MANIFEST": _rlocationpath(manifest, ctx.workspace_name),
     }
 
-    data = [playbook, config, hosts_file] + vault_files + inventory_files + role_files
+    data = [manifest, playbook, config, hosts_file] + vault_files + inventory_files + role_files
+    data.extend(ansible_toolchain.strategy_plugins + ansible_toolchain.connection_plugins)
 
     script_info = get_process_wrapper_attr(ctx, "_launcher")
 
     runner, runfiles = generate_process_wrapper(
         ctx = ctx,
         script_info = script_info,
-        runfiles = ctx.runfiles(files = data, transitive_files = venv_toolchain.all_files),
+        runfiles = ctx.runfiles(
+            files = data,
+            transitive_files = depset(transitive = [ansible_toolchain.collections, venv_toolchain.all_files]),
+        ),
+        deps = ansible_toolchain.plugin_deps,
     )
 
     return [
@@ -195,7 +228,7 @@ ansible_playbook = rule(
     doc = "A rule for running [Ansible playbooks](https://docs.ansible.com/ansible/latest/user_guide/playbooks_intro.html)",
     attrs = {
         "config": attr.label(
-            doc = "The path to an Ansible config file.",
+            doc = "The path to an Ansible config file or an `ansible_config` target.",
             default = Label("//ansible:config"),
             allow_single_file = True,
         ),
@@ -238,5 +271,6 @@ ansible_playbook = rule(
     executable = True,
     toolchains = [
         py_venv_common.TOOLCHAIN_TYPE,
+        str(Label("//ansible:toolchain_type")),
     ],
 )
@@ -0,0 +1,69 @@
+"""A utility for merging ansible config files."""
+
+import argparse
+import configparser
+from pathlib import Path
+from typing import Optional, Sequence
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    Args:
+        argv: An optional set of args to use instead of `sys.argv[1:]`
+
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--base",
+        type=Path,
+        required=True,
+        help="The ansible config file to merge settings over.",
+    )
+    parser.add_argument(
+        "--overrides",
+        type=Path,
+        required=True,
+        help="An ansible config file whose settings take precedence over `--base`.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="The path of the merged ansible config file.",
+    )
+
+    return parser.parse_args(argv)
+
+
+def load_config(path: Path, config: configparser.ConfigParser) -> None:
+    """Load an ansible config file into an existing parser.
+
+    Args:
+        path: The path to the config file.
+        config: The parser to load settings into.
+    """
+    config.read_string(path.read_text(encoding="utf-8"), source=str(path))
+
+
+def main() -> None:
+    """The main entrypoint of the script."""
+    args = parse_args()
+
+    config = configparser.ConfigParser(interpolation=None, strict=False)
+
+    # Ansible config keys are case sensitive.
+    config.optionxform = str  # type: ignore
+
+    load_config(args.base, config)
+    load_config(args.overrides, config)
+
+    with args.output.open("w", encoding="utf-8") as output:
+        config.write(output)
+
+
+if __name__ == "__main__":
+    main()
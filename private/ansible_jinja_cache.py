@@ -0,0 +1,400 @@
+"""A persistent cache of compiled Jinja2 templates for ansible.
+
+Running this script with the path to an ansible entrypoint installs the cache
+into the current interpreter and then runs the entrypoint. Forked ansible
+workers inherit the cache.
+"""
+
+import contextvars
+import hashlib
+import importlib.metadata
+import importlib.util
+import json
+import logging
+import marshal
+import os
+import runpy
+import sys
+import tempfile
+from pathlib import Path
+from types import CodeType
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import private.ansible_settings as ansible_settings
+
+ENV_RULES_ANSIBLE_JINJA_CACHE = "RULES_ANSIBLE_JINJA_CACHE"
+ENV_RULES_ANSIBLE_JINJA_CACHE_MAX_SIZE = "RULES_ANSIBLE_JINJA_CACHE_MAX_SIZE"
+
+# The default maximum size of the cache directory in bytes.
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# Bump this if the format of cache entries changes.
+CACHE_VERSION = "1"
+
+# The source of the expression being compiled by `Environment.compile_expression`.
+_EXPRESSION_SOURCE: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "expression_source", default=None
+)
+
+# Environment attributes which influence the code generated for a template.
+_ENVIRONMENT_OPTIONS = (
+    "block_start_string",
+    "block_end_string",
+    "variable_start_string",
+    "variable_end_string",
+    "comment_start_string",
+    "comment_end_string",
+    "line_statement_prefix",
+    "line_comment_prefix",
+    "trim_blocks",
+    "lstrip_blocks",
+    "newline_sequence",
+    "keep_trailing_newline",
+    "optimized",
+    "is_async",
+    "sandboxed",
+)
+
+
+def default_cache_dir() -> Path:
+    """Return the default location of the template cache.
+
+    Returns:
+        A directory within the user's cache directory.
+    """
+    cache_home = os.getenv("XDG_CACHE_HOME")
+    if cache_home:
+        return Path(cache_home) / "rules_ansible/jinja2"
+    return Path.home() / ".cache/rules_ansible/jinja2"
+
+
+def get_cache_dir() -> Optional[Path]:
+    """Determine whether or not the cache was requested and where it's located.
+
+    `RULES_ANSIBLE_JINJA_CACHE` may be set to `1` to use `default_cache_dir`
+    or to the path of a directory.
+
+    Returns:
+        The cache directory if caching is enabled.
+    """
+    value = os.getenv(ENV_RULES_ANSIBLE_JINJA_CACHE)
+    if not value or value in ("0", "false", "False"):
+        return None
+    if value in ("1", "true", "True"):
+        return default_cache_dir()
+    return Path(value)
+
+
+def get_max_size() -> int:
+    """Return the maximum size of the cache directory in bytes.
+
+    Returns:
+        The value of `RULES_ANSIBLE_JINJA_CACHE_MAX_SIZE` or `DEFAULT_MAX_SIZE`.
+    """
+    return int(os.getenv(ENV_RULES_ANSIBLE_JINJA_CACHE_MAX_SIZE, str(DEFAULT_MAX_SIZE)))
+
+
+class TemplateCodeCache:
+    """A content addressed, on disk cache of compiled template code objects.
+
+    Jinja2 resolves how filters and tests are called when a template is
+    compiled, so changes to plugins which are not reflected in a collection's
+    version may require the cache to be cleared.
+    """
+
+    def __init__(self, cache_dir: Path, salt: str) -> None:
+        """Constructor.
+
+        Args:
+            cache_dir: The directory to store entries in.
+            salt: Data identifying the interpreter, Jinja2, ansible-core and plugins.
+        """
+        self.cache_dir = cache_dir
+        self.salt = salt
+        self._memory: Dict[str, CodeType] = {}
+
+    def key(self, environment: Any, source: str, *details: Any) -> str:
+        """Compute the cache key of a template.
+
+        Args:
+            environment: The Jinja2 environment compiling the template.
+            source: The template source.
+            *details: Additional arguments which influence compilation.
+
+        Returns:
+            A hex digest.
+        """
+        env_type = type(environment)
+        options = [
+            repr(getattr(environment, option, None)) for option in _ENVIRONMENT_OPTIONS
+        ]
+        options.append(repr(sorted(getattr(environment, "extensions", {}))))
+        autoescape = getattr(environment, "autoescape", False)
+        options.append(repr(autoescape) if isinstance(autoescape, bool) else "callable")
+
+        hasher = hashlib.sha256()
+        for part in [
+            self.salt,
+            f"{env_type.__module__}.{env_type.__qualname__}",
+            *options,
+            *(repr(detail) for detail in details),
+            source,
+        ]:
+            hasher.update(part.encode("utf-8", "surrogatepass"))
+            hasher.update(b"\0")
+        return hasher.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def load(self, key: str) -> Optional[CodeType]:
+        """Load a code object from the cache.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The cached code object if one was found.
+        """
+        code = self._memory.get(key)
+        if code is not None:
+            return code
+
+        path = self._path(key)
+        try:
+            code = marshal.loads(path.read_bytes())
+            # Refresh the modification time so eviction is least recently used.
+            os.utime(path)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+        if not isinstance(code, CodeType):
+            return None
+
+        self._memory[key] = code
+        return code
+
+    def store(self, key: str, code: CodeType) -> None:
+        """Store a code object in the cache.
+
+        Args:
+            key: The cache key.
+            code: The compiled template code.
+        """
+        self._memory[key] = code
+
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=path.parent, prefix=".tmp", delete=False
+            ) as tmp:
+                tmp.write(marshal.dumps(code))
+            os.replace(tmp.name, path)
+        except OSError as exc:
+            logging.debug("Failed to write template cache entry %s: %s", path, exc)
+
+
+def _collection_versions(collections_paths: Sequence[str]) -> List[str]:
+    """Describe the versions of collections installed in collection search paths.
+
+    Args:
+        collections_paths: The collection search paths ansible will use.
+
+    Returns:
+        The location and version of each collection with a `MANIFEST.json`.
+    """
+    versions = []
+    for path in collections_paths:
+        root = Path(os.path.expanduser(path))
+        if root.name != "ansible_collections":
+            root = root / "ansible_collections"
+        for manifest in sorted(root.glob("*/*/MANIFEST.json")):
+            try:
+                info = json.loads(manifest.read_text(encoding="utf-8"))
+                version = info["collection_info"]["version"]
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+            versions.append(f"{manifest.parent}={version}")
+    return versions
+
+
+def _cache_salt() -> str:
+    """Identify everything outside of a template which changes its compiled form.
+
+    Returns:
+        A string describing the interpreter, Jinja2 and ansible versions along
+        with the plugin and collection search paths ansible will use.
+    """
+    # pylint: disable=import-outside-toplevel
+    import jinja2
+    from ansible.release import __version__ as ansible_version
+
+    # Collections bundled with the `ansible` package are identified by its version.
+    try:
+        ansible_package_version = importlib.metadata.version("ansible")
+    except importlib.metadata.PackageNotFoundError:
+        ansible_package_version = ""
+
+    config_file = ansible_settings.find_config_file(os.environ)
+    search_paths = {
+        setting.env: ansible_settings.configured_paths(setting, os.environ, config_file)
+        for setting in (
+            ansible_settings.COLLECTIONS_PATH,
+            ansible_settings.FILTER_PLUGINS,
+            ansible_settings.TEST_PLUGINS,
+        )
+    }
+
+    return "\0".join(
+        [
+            CACHE_VERSION,
+            sys.implementation.cache_tag or "",
+            importlib.util.MAGIC_NUMBER.hex(),
+            jinja2.__version__,
+            ansible_version,
+            ansible_package_version,
+            *(f"{env}={os.pathsep.join(paths)}" for env, paths in search_paths.items()),
+            *_collection_versions(search_paths[ansible_settings.COLLECTIONS_PATH.env]),
+        ]
+    )
+
+
+def _compile_state(environment: Any) -> Optional[str]:
+    """Describe state ansible applies while compiling outside of the environment.
+
+    ansible-core activates a compile context (e.g. `escape_backslashes`) which
+    changes how templates are tokenized. Its templating module is looked up
+    rather than imported as templates are compiled while `ansible.constants`
+    is still being initialized, which the templating module itself imports.
+
+    Args:
+        environment: The Jinja2 environment compiling the template.
+
+    Returns:
+        A description of the state or `None` if the compilation must not be cached.
+    """
+    # pylint: disable=protected-access
+    jinja_bits = sys.modules.get("ansible._internal._templating._jinja_bits")
+    if jinja_bits is None:
+        return None
+
+    # Debuggable templates inject breakpoints and temporary files into the compiled code.
+    if getattr(environment, "_debuggable_template_source", False):
+        return None
+    if jinja_bits._CompileStateSmugglingCtx.current(optional=True):
+        return None
+
+    return repr(jinja_bits._TemplateCompileContext.current(optional=True))
+
+
+def install(cache_dir: Path) -> TemplateCodeCache:
+    """Patch Jinja2 to cache compiled templates and expressions in `cache_dir`.
+
+    Args:
+        cache_dir: The directory to store compiled templates in.
+
+    Returns:
+        The installed cache.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from jinja2 import Environment, nodes
+
+    cache = TemplateCodeCache(cache_dir, _cache_salt())
+    compile_template: Callable[..., Any] = Environment.compile
+    compile_expression: Callable[..., Any] = Environment.compile_expression
+
+    def _cached_compile(  # type: ignore[no-untyped-def]
+        self,
+        source,
+        name=None,
+        filename=None,
+        raw=False,
+        defer_init=False,
+    ):
+        if raw:
+            return compile_template(self, source, name, filename, raw, defer_init)
+
+        # Expressions are parsed before being compiled so their source is
+        # used to identify the parsed template.
+        if isinstance(source, str):
+            key_source, kind = source, "template"
+        elif isinstance(source, nodes.Template) and _EXPRESSION_SOURCE.get():
+            key_source, kind = _EXPRESSION_SOURCE.get(), "expression"
+        else:
+            return compile_template(self, source, name, filename, raw, defer_init)
+
+        state = _compile_state(self)
+        if state is None:
+            return compile_template(self, source, name, filename, raw, defer_init)
+
+        key = cache.key(self, key_source, kind, state, name, filename, defer_init)
+        code = cache.load(key)
+        if code is None:
+            code = compile_template(self, source, name, filename, raw, defer_init)
+            cache.store(key, code)
+        return code
+
+    def _cached_compile_expression(  # type: ignore[no-untyped-def]
+        self, source, undefined_to_none=True
+    ):
+        token = _EXPRESSION_SOURCE.set(source)
+        try:
+            return compile_expression(self, source, undefined_to_none)
+        finally:
+            _EXPRESSION_SOURCE.reset(token)
+
+    Environment.compile = _cached_compile  # type: ignore[method-assign]
+    Environment.compile_expression = _cached_compile_expression  # type: ignore[method-assign]
+
+    return cache
+
+
+def evict(cache_dir: Path, max_size: int) -> None:
+    """Delete the least recently used entries until the cache fits within `max_size`.
+
+    Args:
+        cache_dir: The cache directory.
+        max_size: The maximum size of the cache in bytes.
+    """
+    if not cache_dir.exists():
+        return
+
+    entries = []
+    total = 0
+    for path in cache_dir.glob("*/*"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    if total <= max_size:
+        return
+
+    for _, size, path in sorted(entries):
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        total -= size
+        if total <= max_size:
+            break
+
+
+def main() -> None:
+    """The main entrypoint of the script."""
+    if len(sys.argv) < 2:
+        raise ValueError("Usage: ansible_jinja_cache.py <entrypoint> [args...]")
+
+    cache_dir = get_cache_dir()
+    if cache_dir:
+        install(cache_dir)
+
+    sys.argv = sys.argv[1:]
+    runpy.run_path(sys.argv[0], run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Tests for the persistent Jinja2 template cache."""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from jinja2 import Environment
+
+import private.ansible_jinja_cache as jinja_cache
+
+
+class TemplateCodeCacheTests(unittest.TestCase):
+    """Tests for caching compiled templates and expressions."""
+
+    def setUp(self) -> None:
+        # pylint: disable-next=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self.tmp_dir.name)
+
+        # Templates are only cached once ansible's templating is loaded.
+        # pylint: disable-next=import-outside-toplevel,unused-import
+        import ansible.template
+
+        # `install` patches Jinja2 so restore it after each test.
+        for attr in ("compile", "compile_expression"):
+            patcher = mock.patch.object(Environment, attr, getattr(Environment, attr))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.cache = jinja_cache.install(self.cache_dir)
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _entries(self) -> int:
+        return len(list(self.cache_dir.glob("*/*")))
+
+    def test_template_disk_hit(self) -> None:
+        """Test that compiling the same template twice loads it from disk."""
+        env = Environment()
+        self.assertEqual(env.from_string("{{ x }}!").render(x=1), "1!")
+        self.assertEqual(self._entries(), 1)
+
+        # Drop entries cached in memory to force a read from disk.
+        self.cache._memory.clear()  # pylint: disable=protected-access
+        with mock.patch.object(self.cache, "store") as store:
+            self.assertEqual(env.from_string("{{ x }}!").render(x=2), "2!")
+
+        store.assert_not_called()
+        self.assertEqual(self._entries(), 1)
+
+    def test_expression_disk_hit(self) -> None:
+        """Test that compiling the same expression twice loads it from disk."""
+        env = Environment()
+        self.assertTrue(env.compile_expression("x == 1")(x=1))
+        self.assertEqual(self._entries(), 1)
+
+        self.cache._memory.clear()  # pylint: disable=protected-access
+        with mock.patch.object(self.cache, "store") as store:
+            self.assertFalse(env.compile_expression("x == 1")(x=2))
+
+        store.assert_not_called()
+
+        # Different expressions must not share entries.
+        self.assertTrue(env.compile_expression("x != 1")(x=2))
+        self.assertEqual(self._entries(), 2)
+
+    def test_escape_backslashes(self) -> None:
+        """Test that ansible's compile context is part of the cache key."""
+        # pylint: disable=import-outside-toplevel
+        from ansible._internal._datatag._tags import TrustedAsTemplate
+        from ansible.parsing.dataloader import DataLoader
+        from ansible.template import Templar
+
+        templar = Templar(loader=DataLoader())
+        template = TrustedAsTemplate().tag('{{ "a\\1" }}')
+
+        for _ in range(2):
+            self.assertEqual(
+                templar.template(template, escape_backslashes=True), "a\\1"
+            )
+            self.assertEqual(
+                templar.template(template, escape_backslashes=False), "a\x01"
+            )
+
+    def test_salt_collections(self) -> None:
+        """Test that collection search paths and versions are part of the salt."""
+        collections_dir = self.cache_dir / "collections"
+        manifest = collections_dir / "ansible_collections/ns/name/MANIFEST.json"
+        manifest.parent.mkdir(parents=True)
+
+        salts = []
+        with mock.patch.dict(os.environ, {"ANSIBLE_COLLECTIONS_PATH": "/missing"}):
+            salts.append(jinja_cache._cache_salt())  # pylint: disable=protected-access
+
+        with mock.patch.dict(
+            os.environ, {"ANSIBLE_COLLECTIONS_PATH": str(collections_dir)}
+        ):
+            for version in ("1.0.0", "1.1.0"):
+                manifest.write_text(
+                    json.dumps({"collection_info": {"version": version}}),
+                    encoding="utf-8",
+                )
+                salts.append(
+                    jinja_cache._cache_salt()  # pylint: disable=protected-access
+                )
+
+        self.assertEqual(len(set(salts)), 3)
+
+    def test_evict(self) -> None:
+        """Test that the least recently used entries are evicted first."""
+        env = Environment()
+        for index in range(3):
+            env.from_string(f"{{{{ x }}}} {index}")
+
+        entries = sorted(self.cache_dir.glob("*/*"))
+        self.assertEqual(len(entries), 3)
+        for mtime, path in enumerate(entries):
+            os.utime(path, (mtime, mtime))
+
+        sizes = [path.stat().st_size for path in entries]
+        jinja_cache.evict(self.cache_dir, sum(sizes) - 1)
+
+        self.assertListEqual(
+            sorted(self.cache_dir.glob("*/*")),
+            entries[1:],
+        )
+
+
+class ShimTests(unittest.TestCase):
+    """Tests which run ansible through the cache shim."""
+
+    def setUp(self) -> None:
+        # pylint: disable-next=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.cache_dir = self.tmp_path / "cache"
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _run_playbook(self, work_dir: Path) -> subprocess.CompletedProcess:
+        """Run a local playbook through the shim.
+
+        Args:
+            work_dir: The working directory to run ansible in.
+
+        Returns:
+            The results of `ansible-playbook`.
+        """
+        playbook = self.tmp_path / "site.yaml"
+        playbook.write_text(
+            textwrap.dedent(
+                """\
+                - name: Render templates
+                  hosts: localhost
+                  gather_facts: false
+                  vars:
+                    greeting: Hello
+                  tasks:
+                    - name: Render a template
+                      ansible.builtin.debug:
+                        msg: "{{ greeting }}, world"
+
+                    - name: Evaluate a conditional
+                      ansible.builtin.assert:
+                        that:
+                          - greeting == 'Hello'
+                """
+            ),
+            encoding="utf-8",
+        )
+
+        entrypoint = Path(jinja_cache.__file__).parent / "scripts/ansible_playbook.py"
+
+        env = {
+            key: value
+            for key, value in os.environ.items()
+            if not key.startswith("ANSIBLE_")
+        }
+        env.update(
+            {
+                "HOME": str(self.tmp_path),
+                "PYTHONPATH": os.pathsep.join(sys.path),
+                jinja_cache.ENV_RULES_ANSIBLE_JINJA_CACHE: str(self.cache_dir),
+            }
+        )
+
+        return subprocess.run(
+            [
+                sys.executable,
+                jinja_cache.__file__,
+                str(entrypoint),
+                "--inventory=localhost,",
+                "--connection=local",
+                str(playbook),
+            ],
+            cwd=work_dir,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            encoding="utf-8",
+            check=False,
+        )
+
+    def test_ansible_playbook(self) -> None:
+        """Test that templating ansible's config defaults is unaffected by the cache."""
+        work_dir = self.tmp_path / "work"
+        work_dir.mkdir()
+
+        for _ in range(2):
+            result = self._run_playbook(work_dir)
+
+            self.assertEqual(result.returncode, 0, result.stdout)
+            self.assertNotIn("Failed to template", result.stdout)
+            self.assertNotIn("WARNING", result.stdout)
+
+        self.assertTrue(list(self.cache_dir.glob("*/*")))
+
+        # Untemplated defaults would create directories like `{{ ANSIBLE_HOME ~ "/tmp" }}`.
+        self.assertListEqual(
+            [path.name for path in work_dir.iterdir() if "{{" in path.name], []
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
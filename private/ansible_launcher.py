@@ -1,26 +1,47 @@
 """The ansible-playbook launcher."""
 
+import asyncio
+import functools
 import json
 import logging
 import os
+import shlex
+import shutil
 import subprocess
 import sys
+import tempfile
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
 
+import private.ansible_jinja_cache as jinja_cache
+import private.ansible_memprofile as memprofile
+import private.ansible_settings as ansible_settings
 from python.runfiles import Runfiles
 
-ENV_ANSIBLE_BZL_PLAYBOOK = "ANSIBLE_BZL_PLAYBOOK"
-ENV_ANSIBLE_BZL_PACKAGE = "ANSIBLE_BZL_PACKAGE"
-ENV_ANSIBLE_BZL_ANSIBLE = "ANSIBLE_BZL_ANSIBLE"
-ENV_ANSIBLE_BZL_ANSIBLE_VAULT = "ANSIBLE_BZL_ANSIBLE_VAULT"
-ENV_ANSIBLE_BZL_ARGS = "ANSIBLE_BZL_ARGS"
-ENV_ANSIBLE_BZL_VAULT_FILES = "ANSIBLE_BZL_VAULT_FILES"
-ENV_ANSIBLE_BZL_CONFIG = "ANSIBLE_BZL_CONFIG"
-ENV_ANSIBLE_BZL_LAUNCHER_NAME = "ANSIBLE_BZL_LAUNCHER_NAME"
-ENV_ANSIBLE_BZL_INVENTORY_HOSTS = "ANSIBLE_BZL_INVENTORY_HOSTS"
+ENV_ANSIBLE_BZL_LAUNCH_MANIFEST = "ANSIBLE_BZL_LAUNCH_MANIFEST"
 
-RUNFILES: Optional[Runfiles] = Runfiles.Create()
+ENV_RULES_ANSIBLE_PREFLIGHT = "RULES_ANSIBLE_PREFLIGHT"
+ENV_RULES_ANSIBLE_PREFLIGHT_TIMEOUT = "RULES_ANSIBLE_PREFLIGHT_TIMEOUT"
+ENV_RULES_ANSIBLE_PREFLIGHT_CONCURRENCY = "RULES_ANSIBLE_PREFLIGHT_CONCURRENCY"
+
+# Connection plugins whose endpoints can be probed with a TCP connection.
+SSH_CONNECTIONS = (
+    "ssh",
+    "smart",
+    "paramiko",
+    "paramiko_ssh",
+    "ansible.builtin.ssh",
+    "ansible.builtin.paramiko_ssh",
+    "ansible.legacy.ssh",
+)
+
+# Options of the `ssh` connection plugin which may route connections through a proxy.
+SSH_ARGS_OPTIONS = ("ssh_args", "ssh_common_args", "ssh_extra_args")
+
+# `ssh_config` keywords which change the endpoint `ssh` connects to.
+SSH_CONFIG_REDIRECTS = ("hostname", "proxyjump", "proxycommand")
+
+RUNFILES: Optional[Runfiles] = None
 
 
 def _rlocation(rlocationpath: str) -> Path:
@@ -32,6 +53,9 @@ def _rlocation(rlocationpath: str) -> Path:
     Returns:
         The requested runifle.
     """
+    global RUNFILES
+    if not RUNFILES:
+        RUNFILES = Runfiles.Create()
     if not RUNFILES:
         raise EnvironmentError("Failed to locate runfiles")
     runfile = RUNFILES.Rlocation(rlocationpath, os.getenv("TEST_WORKSPACE"))
@@ -43,16 +67,166 @@ def _rlocation(rlocationpath: str) -> Path:
     return path
 
 
+def _scan_runfiles_manifest(
+    manifest: Path, rlocationpaths: Sequence[str]
+) -> Dict[str, Path]:
+    """Locate runfiles with a single pass over a runfiles manifest.
+
+    Unlike `Runfiles.Create`, this does not load the manifest into memory and
+    stops reading once all requested runfiles were found.
+
+    Args:
+        manifest: The runfiles manifest file.
+        rlocationpaths: The runfile keys to locate. These may be files or directories.
+
+    Returns:
+        A mapping of runfile keys to the paths which were found.
+    """
+    found: Dict[str, Path] = {}
+    pending = set(rlocationpaths)
+    with manifest.open(encoding="utf-8") as handle:
+        for line in handle:
+            if not pending:
+                break
+
+            # Entries containing escaped characters start with a space and are
+            # left to the runfiles library.
+            key, sep, value = line.rstrip("\n").partition(" ")
+            if not key or not sep:
+                continue
+
+            for rlocationpath in list(pending):
+                if key == rlocationpath:
+                    found[rlocationpath] = Path(value)
+                elif key.startswith(rlocationpath + "/"):
+                    # Directories are not listed but can be derived from their contents.
+                    suffix = key[len(rlocationpath) :]
+                    if not value.endswith(suffix):
+                        continue
+                    found[rlocationpath] = Path(value[: -len(suffix)])
+                else:
+                    continue
+                pending.discard(rlocationpath)
+
+    return found
+
+
+def find_runfiles(rlocationpaths: Sequence[str]) -> List[Path]:
+    """Look up runfiles without loading the runfiles manifest where possible.
+
+    Runfiles are joined with the runfiles directory when one exists. Otherwise
+    they are located through a single targeted scan of the runfiles manifest.
+    The runfiles library is only used for entries neither approach can find.
+
+    Args:
+        rlocationpaths: The runfile keys.
+
+    Returns:
+        The requested runfiles in the same order as `rlocationpaths`.
+    """
+    paths: Dict[str, Path] = {}
+
+    runfiles_dir = os.getenv("RUNFILES_DIR")
+    if runfiles_dir:
+        for rlocationpath in rlocationpaths:
+            path = Path(runfiles_dir) / rlocationpath
+            if path.exists():
+                paths[rlocationpath] = path
+
+    missing = [path for path in rlocationpaths if path not in paths]
+    manifest_file = os.getenv("RUNFILES_MANIFEST_FILE")
+    if missing and manifest_file and Path(manifest_file).exists():
+        paths.update(_scan_runfiles_manifest(Path(manifest_file), missing))
+
+    return [
+        paths[rlocationpath] if rlocationpath in paths else _rlocation(rlocationpath)
+        for rlocationpath in rlocationpaths
+    ]
+
+
+def find_launch_manifest(rlocationpath: str) -> Path:
+    """Locate the launch manifest of the current `ansible_playbook` target.
+
+    Args:
+        rlocationpath: The runfile key of the launch manifest.
+
+    Returns:
+        The path to the launch manifest.
+    """
+    runfiles_dir = os.getenv("RUNFILES_DIR")
+    if runfiles_dir:
+        path = Path(runfiles_dir) / rlocationpath
+        if path.exists():
+            return path
+
+    # Without a runfiles directory, the launch manifest is found next to the
+    # executable of the target which in turn is located through the path of its
+    # runfiles manifest (`<executable>.runfiles_manifest` or `<executable>.runfiles/MANIFEST`).
+    manifest_file = os.getenv("RUNFILES_MANIFEST_FILE")
+    if manifest_file:
+        runfiles_manifest = Path(manifest_file)
+        if runfiles_manifest.name == "MANIFEST":
+            bin_dir = runfiles_manifest.parent.parent
+        else:
+            bin_dir = runfiles_manifest.parent
+        staging_dir, basename = rlocationpath.split("/")[-2:]
+        path = bin_dir / staging_dir / basename
+        if path.exists():
+            return path
+
+    return find_runfiles([rlocationpath])[0]
+
+
+@functools.lru_cache(maxsize=None)
+def load_launch_manifest() -> Tuple[Path, Dict[str, Any]]:
+    """Load the launch manifest written by the `ansible_playbook` rule.
+
+    The manifest describes all settings of the target. Paths to files staged
+    by the target are relative to the manifest so they can be resolved without
+    consulting runfiles.
+
+    Returns:
+        The directory containing the manifest and its parsed content.
+    """
+    env = os.getenv(ENV_ANSIBLE_BZL_LAUNCH_MANIFEST)
+    if not env:
+        raise EnvironmentError("{} is not set".format(ENV_ANSIBLE_BZL_LAUNCH_MANIFEST))
+
+    manifest = find_launch_manifest(env)
+    return manifest.parent, json.loads(manifest.read_text(encoding="utf-8"))
+
+
+def _manifest_value(key: str) -> Any:
+    """Look up a setting from the launch manifest.
+
+    Args:
+        key: The name of the setting.
+
+    Returns:
+        The value of the setting.
+    """
+    return load_launch_manifest()[1][key]
+
+
+def _manifest_path(path: str) -> Path:
+    """Resolve a path relative to the launch manifest.
+
+    Args:
+        path: A path from the launch manifest.
+
+    Returns:
+        The absolute path.
+    """
+    return load_launch_manifest()[0] / path
+
+
 def get_playbook() -> Path:
     """Get the path of the playbook to run.
 
     Returns:
         The path to the playbook to run
     """
-    env = os.getenv(ENV_ANSIBLE_BZL_PLAYBOOK)
-    if not env:
-        raise EnvironmentError("{} is not set".format(ENV_ANSIBLE_BZL_PLAYBOOK))
-    return _rlocation(env)
+    return _manifest_path(_manifest_value("playbook"))
 
 
 def get_inventory_hosts() -> Path:
@@ -61,10 +235,7 @@ def get_inventory_hosts() -> Path:
     Returns:
         The path to `hosts`.
     """
-    env = os.getenv(ENV_ANSIBLE_BZL_INVENTORY_HOSTS)
-    if not env:
-        raise EnvironmentError("{} is not set".format(ENV_ANSIBLE_BZL_INVENTORY_HOSTS))
-    return _rlocation(env)
+    return _manifest_path(_manifest_value("inventory_hosts"))
 
 
 def get_ansible_config() -> Path:
@@ -73,10 +244,7 @@ def get_ansible_config() -> Path:
     Returns:
         The path to the ansible config
     """
-    env = os.getenv(ENV_ANSIBLE_BZL_CONFIG)
-    if not env:
-        raise EnvironmentError("{} is not set".format(ENV_ANSIBLE_BZL_CONFIG))
-    return _rlocation(env)
+    return _manifest_path(_manifest_value("config"))
 
 
 def get_ansible_package() -> str:
@@ -85,10 +253,7 @@ def get_ansible_package() -> str:
     Returns:
         The Bazel package name of the current target.
     """
-    env = os.getenv(ENV_ANSIBLE_BZL_PACKAGE)
-    if not env:
-        raise EnvironmentError("{} is not set".format(ENV_ANSIBLE_BZL_PACKAGE))
-    return env
+    return _manifest_value("package")
 
 
 def get_ansible_bin() -> Path:
@@ -117,6 +282,45 @@ def get_ansible_vault_bin() -> Path:
     return path
 
 
+def get_ansible_jinja_cache_shim() -> Path:
+    """Locate the entrypoint shim which installs the Jinja2 template cache
+
+    Returns:
+        A python entrypoint.
+    """
+    path = Path(jinja_cache.__file__)
+    if not path.exists():
+        raise FileNotFoundError(path)
+
+    return path
+
+
+def get_ansible_memprofile_shim() -> Path:
+    """Locate the entrypoint shim which instruments memory usage
+
+    Returns:
+        A python entrypoint.
+    """
+    path = Path(memprofile.__file__)
+    if not path.exists():
+        raise FileNotFoundError(path)
+
+    return path
+
+
+def get_memprofile_output() -> Path:
+    """Determine where to write memory profiling reports for the current run.
+
+    Returns:
+        A path in the directory `bazel run` was invoked from.
+    """
+    name = _manifest_value("launcher_name")
+    working_dir = os.getenv("BUILD_WORKING_DIRECTORY")
+    if working_dir:
+        return Path(working_dir) / f"{name}.memprofile.json"
+    return Path.cwd() / f"{name}.memprofile.json"
+
+
 def get_bazel_workspace_root() -> Path:
     """Get the workspace root of the current target
 
@@ -135,34 +339,102 @@ def get_ansible_args() -> List[str]:
     Returns:
         A list of arguments to pass to `ansible-playbook.`
     """
-    env = os.getenv(ENV_ANSIBLE_BZL_ARGS)
-    if not env:
-        raise EnvironmentError("{} is not set".format(ENV_ANSIBLE_BZL_ARGS))
-    return json.loads(env)
+    return list(_manifest_value("args"))
 
 
-def get_ansible_vault_files() -> List[str]:
+def get_ansible_vault_files() -> List[Path]:
     """Return any vault encrypted files passed to the `ansible_playbook` target.
 
     Returns:
         A list of vault files
     """
-    env = os.getenv(ENV_ANSIBLE_BZL_VAULT_FILES)
-    if not env:
-        raise EnvironmentError("{} is not set".format(ENV_ANSIBLE_BZL_VAULT_FILES))
-    return [_rlocation(file) for file in json.loads(env)]
+    return [_manifest_path(file) for file in _manifest_value("vault_files")]
 
 
-def find_vault_key() -> Optional[Path]:
+def get_ansible_collections_paths() -> List[Path]:
+    """Return the directories of any collections vendored by the ansible toolchain.
+
+    Returns:
+        A list of directories containing `ansible_collections`.
+    """
+    return find_runfiles(_manifest_value("collections"))
+
+
+def get_plugin_dirs(key: str) -> List[Path]:
+    """Return the directories of plugins provided by the ansible toolchain.
+
+    Args:
+        key: The launch manifest key containing plugin runfiles.
+
+    Returns:
+        A deduplicated list of plugin directories.
+    """
+    plugin_dirs: List[Path] = []
+    for path in find_runfiles(_manifest_value(key)):
+        plugin_dir = path.parent
+        if plugin_dir not in plugin_dirs:
+            plugin_dirs.append(plugin_dir)
+    return plugin_dirs
+
+
+def apply_plugin_env(env: Dict[str, str], config_file: Optional[Path]) -> None:
+    """Apply plugin settings from the ansible toolchain to an ansible environment.
+
+    Plugin directories are searched before any configured by the caller or playbook
+    while the toolchain's strategy and connection are only used when neither the
+    caller nor the playbook's config file select one.
+
+    Args:
+        env: The environment ansible will be run with. This is updated in place.
+        config_file: The ansible config file ansible will be run with.
+    """
+    ansible_settings.prepend_paths(
+        env,
+        config_file,
+        ansible_settings.STRATEGY_PLUGINS,
+        get_plugin_dirs("strategy_plugins"),
+    )
+    ansible_settings.prepend_paths(
+        env,
+        config_file,
+        ansible_settings.CONNECTION_PLUGINS,
+        get_plugin_dirs("connection_plugins"),
+    )
+    ansible_settings.set_default(
+        env, config_file, ansible_settings.STRATEGY, _manifest_value("strategy")
+    )
+    ansible_settings.set_default(
+        env, config_file, ansible_settings.TRANSPORT, _manifest_value("connection")
+    )
+
+
+def get_ansible_forks() -> Optional[int]:
+    """Return the number of forks requested by an `ansible_config` target.
+
+    Returns:
+        The number of available cores if requested, otherwise `None`.
+    """
+    if _manifest_value("forks") != "auto":
+        return None
+
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+
+def find_vault_key(hosts_file: Path) -> Optional[Path]:
     """Locate the vault password file
 
+    Args:
+        hosts_file: The inventory `hosts` file of the playbook.
+
     Returns:
         The path to the vault password file if found.
     """
     # This assumes inventories are structured as `./inventories/<environment>/hosts`.
     # So if the grand parent of the hosts file is not a directory named `inventories`,
     # we assume the vault pass directory is structured in the same way.
-    hosts_file = get_inventory_hosts()
     if hosts_file.parent.parent.name == "inventories":
         vault_pass_file = Path(".vault_pass") / hosts_file.parent.name
     else:
@@ -257,17 +529,428 @@ def decrypt_vault(
     return decrypted_files
 
 
+def get_ansible_env() -> Dict[str, str]:
+    """Return the environment to use for running ansible.
+
+    Returns:
+        The current environment updated with settings from the `ansible_playbook` target.
+    """
+    env = dict(os.environ)
+    cfg = get_ansible_config()
+    if cfg and "ANSIBLE_CONFIG" not in env:
+        env.update({"ANSIBLE_CONFIG": str(cfg)})
+
+    # Vendored collections are searched before any configured by the caller or playbook.
+    config_file = Path(env["ANSIBLE_CONFIG"]) if env.get("ANSIBLE_CONFIG") else None
+    ansible_settings.prepend_paths(
+        env,
+        config_file,
+        ansible_settings.COLLECTIONS_PATH,
+        get_ansible_collections_paths(),
+    )
+
+    forks = get_ansible_forks()
+    if forks and "ANSIBLE_FORKS" not in env:
+        env.update({"ANSIBLE_FORKS": str(forks)})
+
+    apply_plugin_env(env, config_file)
+
+    return env
+
+
+def split_limit_args(args: Sequence[str]) -> Tuple[Optional[str], List[str]]:
+    """Separate any `--limit` pattern from a list of `ansible-playbook` arguments.
+
+    Args:
+        args: Arguments for `ansible-playbook`.
+
+    Returns:
+        The last requested limit pattern, if any, and the remaining arguments.
+    """
+    limit = None
+    remaining = []
+    args_iter = iter(args)
+    for arg in args_iter:
+        if arg in ("-l", "--limit"):
+            limit = next(args_iter, None)
+        elif arg.startswith("--limit="):
+            limit = arg[len("--limit=") :]
+        elif arg.startswith("-l") and not arg.startswith("--"):
+            limit = arg[len("-l") :]
+        else:
+            remaining.append(arg)
+
+    return limit, remaining
+
+
+def apply_limit_exclusions(args: Sequence[str], hosts: Sequence[str]) -> List[str]:
+    """Exclude hosts from a run by extending the `--limit` pattern of `ansible-playbook` arguments.
+
+    `ansible-playbook` only honors the last `--limit` flag so exclusions are added
+    to the patterns of the caller's limit. The limit is split the way ansible splits
+    it so that patterns separated by `:` are kept intact.
+
+    Args:
+        args: Arguments for `ansible-playbook`.
+        hosts: The names of hosts to exclude.
+
+    Returns:
+        The updated arguments.
+    """
+    if not hosts:
+        return list(args)
+
+    # pylint: disable-next=import-outside-toplevel
+    from ansible.inventory.manager import split_host_pattern
+
+    limit, remaining = split_limit_args(args)
+    patterns = split_host_pattern(limit) if limit else ["all"]
+    patterns.extend(f"!{host}" for host in hosts)
+    return remaining + ["--limit", ",".join(patterns)]
+
+
+def ssh_args_use_proxy(ssh_args: str) -> bool:
+    """Determine whether or not `ssh` arguments may route connections elsewhere.
+
+    Args:
+        ssh_args: Arguments ansible passes to `ssh`.
+
+    Returns:
+        True if the arguments set a proxy or an alternate `ssh_config` file.
+    """
+    if "{{" in ssh_args:
+        return True
+
+    try:
+        tokens = shlex.split(ssh_args)
+    except ValueError:
+        tokens = ssh_args.split()
+
+    for token in tokens:
+        if token.startswith(("-J", "-F")):
+            return True
+        if "proxyjump" in token.lower() or "proxycommand" in token.lower():
+            return True
+
+    return False
+
+
+def ssh_config_may_redirect() -> bool:
+    """Determine whether or not `ssh_config` files may change the endpoints of hosts.
+
+    Returns:
+        True if the user or system `ssh_config` sets hostnames or proxies.
+    """
+    # `ssh` locates the user config through the password database rather than `HOME`.
+    try:
+        # pylint: disable-next=import-outside-toplevel
+        import pwd
+
+        home = Path(pwd.getpwuid(os.getuid()).pw_dir)
+    except (ImportError, KeyError):
+        home = Path.home()
+
+    user_config = home / ".ssh/config"
+    system_configs = [Path("/etc/ssh/ssh_config")] + sorted(
+        Path("/etc/ssh/ssh_config.d").glob("*.conf")
+    )
+
+    for path in [user_config] + system_configs:
+        try:
+            content = path.read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            continue
+
+        # Files included from the user config cannot be accounted for.
+        keywords: Tuple[str, ...] = SSH_CONFIG_REDIRECTS
+        if path == user_config:
+            keywords = SSH_CONFIG_REDIRECTS + ("include",)
+
+        for line in content.splitlines():
+            keyword = line.strip().replace("=", " ").split(" ", 1)[0].lower()
+            if keyword in keywords:
+                return True
+
+    return False
+
+
+async def resolve_ssh_config(
+    address: str, port: Optional[int], semaphore: asyncio.Semaphore
+) -> Optional[Tuple[str, int]]:
+    """Resolve the endpoint `ssh` connects to for a host using `ssh -G`.
+
+    Args:
+        address: The address ansible connects to.
+        port: The port ansible connects to if one was set.
+        semaphore: A semaphore limiting the number of concurrent lookups.
+
+    Returns:
+        The resolved address and port or `None` if connections go through a proxy.
+    """
+    ssh = shutil.which("ssh")
+    if not ssh:
+        return address, port or 22
+
+    command = [ssh, "-G"]
+    if port:
+        command.extend(["-p", str(port)])
+    command.append(address)
+
+    async with semaphore:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            stdout, _ = await proc.communicate()
+        except OSError:
+            return address, port or 22
+
+    if proc.returncode:
+        return address, port or 22
+
+    options = {}
+    for line in stdout.decode("utf-8", errors="replace").splitlines():
+        key, _, value = line.partition(" ")
+        options[key.lower()] = value.strip()
+
+    for key in ("proxyjump", "proxycommand"):
+        if options.get(key, "none").lower() != "none":
+            return None
+
+    return options.get("hostname", address), int(options.get("port", port or 22))
+
+
+def resolve_inventory_endpoints(
+    inventory: Path, limit: Optional[str] = None
+) -> Dict[str, Tuple[str, Optional[int]]]:
+    """Resolve the network endpoints of hosts which are connected to over SSH.
+
+    Ansible reads its configuration at import time so the process environment
+    must already contain the settings returned by `get_ansible_env`.
+
+    Hosts which are connected to through an SSH proxy set in their `ssh`
+    arguments cannot be probed directly and are skipped with a warning.
+
+    Args:
+        inventory: The inventory `hosts` file.
+        limit: An optional `--limit` pattern to restrict hosts to.
+
+    Returns:
+        A mapping of inventory hostnames to their address and port, if one was set.
+    """
+    # pylint: disable=import-outside-toplevel
+    from ansible import constants as C
+    from ansible.inventory.manager import InventoryManager
+    from ansible.parsing.dataloader import DataLoader
+    from ansible.plugins.loader import connection_loader
+    from ansible.vars.manager import VariableManager
+
+    loader = DataLoader()
+    manager = InventoryManager(loader=loader, sources=[str(inventory)])
+    variables = VariableManager(loader=loader, inventory=manager)
+    if limit:
+        manager.subset(limit)
+
+    # Load the option definitions of the `ssh` plugin to look up its arguments.
+    connection_loader.get("ssh", class_only=True)
+
+    endpoints = {}
+    for host in manager.get_hosts():
+        try:
+            host_vars = variables.get_vars(host=host, include_hostvars=False)
+        except Exception:  # pylint: disable=broad-exception-caught
+            # Variables may not be loadable without vault secrets. Fall back
+            # to what was defined directly in the inventory.
+            host_vars = host.get_vars()
+
+        connection = str(host_vars.get("ansible_connection", C.DEFAULT_TRANSPORT))
+        if connection not in SSH_CONNECTIONS:
+            continue
+
+        address = str(host_vars.get("ansible_host", host.name))
+        port = host_vars.get("ansible_port", host_vars.get("ansible_ssh_port"))
+        if "{{" in address or "{{" in str(port):
+            logging.debug("Skipping templated endpoint for %s", host.name)
+            continue
+
+        ssh_args = " ".join(
+            str(
+                C.config.get_config_value(
+                    option,
+                    plugin_type="connection",
+                    plugin_name="ssh",
+                    variables=host_vars,
+                )
+                or ""
+            )
+            for option in SSH_ARGS_OPTIONS
+        )
+
+        if ssh_args_use_proxy(ssh_args):
+            _report_proxied_host(host.name)
+            continue
+
+        endpoints[host.name] = (address, int(port) if port else None)
+
+    return endpoints
+
+
+def _report_proxied_host(host: str) -> None:
+    """Warn that a host cannot be probed as it is reached through an SSH proxy.
+
+    Args:
+        host: The name of the host.
+    """
+    print(
+        f"Preflight: {host} is reached through an SSH proxy and was not probed",
+        file=sys.stderr,
+    )
+
+
+async def _probe_endpoint(
+    address: str, port: int, timeout: float, semaphore: asyncio.Semaphore
+) -> bool:
+    """Attempt to open a TCP connection to an endpoint.
+
+    Args:
+        address: The address of the host.
+        port: The port to connect to.
+        timeout: The number of seconds to wait for a connection.
+        semaphore: A semaphore limiting the number of concurrent connections.
+
+    Returns:
+        True if a connection could be established.
+    """
+    async with semaphore:
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(address, port), timeout
+            )
+        except (OSError, asyncio.TimeoutError):
+            return False
+
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+        return True
+
+
+def find_unreachable_hosts(
+    endpoints: Mapping[str, Tuple[str, Optional[int]]],
+    timeout: float = 2.0,
+    concurrency: int = 256,
+    use_ssh_config: bool = False,
+) -> List[str]:
+    """Concurrently probe the endpoints of hosts.
+
+    Args:
+        endpoints: A mapping of hostnames to their address and port, if one was set.
+        timeout: The number of seconds to wait for each connection.
+        concurrency: The maximum number of connections or `ssh` lookups to run at once.
+        use_ssh_config: Whether or not to resolve endpoints through `ssh -G` first.
+            Hosts which `ssh_config` routes through a proxy are not probed.
+
+    Returns:
+        The names of hosts which could not be connected to.
+    """
+
+    async def _probe_host(
+        host: str, address: str, port: Optional[int], semaphore: asyncio.Semaphore
+    ) -> bool:
+        endpoint: Optional[Tuple[str, int]] = (address, port or 22)
+        if use_ssh_config:
+            endpoint = await resolve_ssh_config(address, port, semaphore)
+        if not endpoint:
+            _report_proxied_host(host)
+            return True
+        return await _probe_endpoint(*endpoint, timeout, semaphore)
+
+    async def _probe_all() -> List[bool]:
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(
+            *(
+                _probe_host(host, address, port, semaphore)
+                for host, (address, port) in endpoints.items()
+            )
+        )
+
+    results = asyncio.run(_probe_all())
+    return [host for host, reachable in zip(endpoints, results) if not reachable]
+
+
+def preflight(args: List[str], env: Dict[str, str]) -> List[str]:
+    """Check the reachability of inventory hosts before running ansible.
+
+    This is enabled by setting `RULES_ANSIBLE_PREFLIGHT` to `fail`, which
+    exits if any host is unreachable, or `exclude`, which excludes unreachable
+    hosts from the run through `--limit`.
+
+    Args:
+        args: Arguments for `ansible-playbook`.
+        env: The environment ansible will be run with.
+
+    Returns:
+        The arguments to run `ansible-playbook` with.
+    """
+    mode = os.getenv(ENV_RULES_ANSIBLE_PREFLIGHT)
+    if not mode:
+        return args
+
+    if mode not in ("fail", "exclude"):
+        raise EnvironmentError(
+            "{} must be one of `fail` or `exclude`. Got `{}`".format(
+                ENV_RULES_ANSIBLE_PREFLIGHT, mode
+            )
+        )
+
+    timeout = float(os.getenv(ENV_RULES_ANSIBLE_PREFLIGHT_TIMEOUT, "2.0"))
+    concurrency = int(os.getenv(ENV_RULES_ANSIBLE_PREFLIGHT_CONCURRENCY, "256"))
+
+    os.environ.update(env)
+    limit, _ = split_limit_args(args)
+    endpoints = resolve_inventory_endpoints(get_inventory_hosts(), limit)
+    unreachable = find_unreachable_hosts(
+        endpoints, timeout, concurrency, use_ssh_config=ssh_config_may_redirect()
+    )
+    logging.debug("Probed %s hosts, %s unreachable", len(endpoints), len(unreachable))
+
+    if not unreachable:
+        return args
+
+    for host in unreachable:
+        address, port = endpoints[host]
+        print(
+            f"Preflight: {host} ({address}:{port or 22}) is unreachable",
+            file=sys.stderr,
+        )
+
+    if mode == "fail":
+        sys.exit(4)
+
+    return apply_limit_exclusions(args, unreachable)
+
+
 def run_ansible(
     playbook: Path,
     vault_password_file: Optional[Path] = None,
     extra_args: List[str] = [],
-) -> None:
+    env: Optional[Dict[str, str]] = None,
+) -> subprocess.CompletedProcess:
     """Run ansible-playbook
 
     Args:
         playbook: The path to the playbook to run.
         vault_password_file: The vault password file to use. E.g. `/ansible/.vault-pass/<inventory>`
         extra_args: Additional arguments to pass to the `ansible-playbook` call.
+        env: The environment to run ansible with. Defaults to `get_ansible_env()`.
+
+    Returns:
+        The results of the `ansible-playbook` process.
     """
     ansible = get_ansible_bin()
 
@@ -278,23 +961,33 @@ def run_ansible(
         "-B",  # don't write .pyc files on import; also PYTHONDONTWRITEBYTECODE=x
         "-s",  # don't add user site directory to sys.path; also PYTHONNOUSERSITE
         "-P",  # safe paths (available in Python 3.11)
-        str(ansible),
-        str(playbook),
-        f"--inventory={inventory}",
     ]
 
+    # Optionally run ansible through a shim which caches compiled templates.
+    if jinja_cache.get_cache_dir():
+        command.append(str(get_ansible_jinja_cache_shim()))
+
+    # Optionally run ansible through a shim which records memory usage.
+    if memprofile.is_enabled():
+        command.append(str(get_ansible_memprofile_shim()))
+
+    command.extend(
+        [
+            str(ansible),
+            str(playbook),
+            f"--inventory={inventory}",
+        ]
+    )
+
     if vault_password_file and vault_password_file.exists():
         command.append(
             f"--vault-password-file={vault_password_file}",
         )
 
-    command.extend(sys.argv[1:])
     command.extend(extra_args)
 
-    env = dict(os.environ)
-    cfg = get_ansible_config()
-    if cfg and "ANSIBLE_CONFIG" not in env:
-        env.update({"ANSIBLE_CONFIG": str(cfg)})
+    if env is None:
+        env = get_ansible_env()
 
     logging.debug("Running subcommand: %s", " ".join(command))
     return subprocess.run(command, env=env, check=False)
@@ -310,7 +1003,7 @@ def main() -> None:
         raise FileNotFoundError("Requested playbook not found", playbook)
 
     # Check for an explicit vault key
-    vault_key = find_vault_key()
+    vault_key = find_vault_key(get_inventory_hosts())
 
     # Check for any vault files
     vault_files = decrypt_vault(
@@ -320,16 +1013,37 @@ def main() -> None:
 
     logging.debug("Decrypted %s vault files", len(vault_files))
 
+    report_dir: Optional[Path] = None
     try:
+        env = get_ansible_env()
+        args = preflight(sys.argv[1:] + get_ansible_args(), env)
+
+        if memprofile.is_enabled():
+            report_dir = Path(tempfile.mkdtemp(suffix=".memprofile"))
+            env.update(memprofile.child_env(report_dir))
+
         result = run_ansible(
             playbook=playbook,
             vault_password_file=vault_key,
-            extra_args=get_ansible_args(),
+            extra_args=args,
+            env=env,
         )
 
+        # Reports are only collected when profiling was enabled above.
+        if report_dir:
+            memprofile_output = get_memprofile_output()
+            memprofile.write_report(memprofile_output, "ansible_launcher", report_dir)
+            logging.debug("Wrote memory profile to %s", memprofile_output)
+
+        cache_dir = jinja_cache.get_cache_dir()
+        if cache_dir:
+            jinja_cache.evict(cache_dir, jinja_cache.get_max_size())
+
         sys.exit(result.returncode)
     finally:
         delete_files(vault_files)
+        if report_dir:
+            shutil.rmtree(report_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":
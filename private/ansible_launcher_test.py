@@ -0,0 +1,362 @@
+"""Tests for the ansible-playbook launcher."""
+
+import json
+import os
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+from unittest import mock
+
+import private.ansible_launcher as launcher
+
+
+class PreflightTests(unittest.TestCase):
+    """Tests for the pre-flight host reachability check."""
+
+    def setUp(self) -> None:
+        self.sockets: List[socket.socket] = []
+
+    def tearDown(self) -> None:
+        for sock in self.sockets:
+            sock.close()
+
+    def _listening_port(self) -> int:
+        """Create a local socket which accepts connections.
+
+        Returns:
+            The port of the socket.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.listen()
+        self.sockets.append(sock)
+        return sock.getsockname()[1]
+
+    def _closed_port(self) -> int:
+        """Find a local port which refuses connections.
+
+        Returns:
+            The port number.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        return port
+
+    def test_find_unreachable_hosts(self) -> None:
+        """Test that only hosts without a listening endpoint are reported."""
+        endpoints = {
+            "web1": ("127.0.0.1", self._listening_port()),
+            "web2": ("127.0.0.1", self._closed_port()),
+            "web3": ("127.0.0.1", self._listening_port()),
+        }
+
+        unreachable = launcher.find_unreachable_hosts(
+            endpoints, timeout=1.0, concurrency=2
+        )
+
+        self.assertListEqual(unreachable, ["web2"])
+
+    @unittest.skipIf(os.name == "nt", "requires a POSIX shell")
+    def test_find_unreachable_hosts_ssh_config(self) -> None:
+        """Test that endpoints are resolved through `ssh -G` before being probed."""
+        with tempfile.TemporaryDirectory() as tmp:
+            ssh = Path(tmp) / "ssh"
+            ssh.write_text(
+                "\n".join(
+                    [
+                        "#!/bin/sh",
+                        'case "$*" in *bastioned*) echo "proxyjump bastion" ;; esac',
+                        'echo "hostname 127.0.0.1"',
+                        f'echo "port {self._listening_port()}"',
+                        "",
+                    ]
+                ),
+                encoding="utf-8",
+            )
+            ssh.chmod(0o755)
+
+            with mock.patch.dict(os.environ, {"PATH": tmp}):
+                unreachable = launcher.find_unreachable_hosts(
+                    {
+                        "web1": ("web1.example.com", None),
+                        "web2": ("bastioned.example.com", self._closed_port()),
+                    },
+                    timeout=1.0,
+                    concurrency=1,
+                    use_ssh_config=True,
+                )
+
+        self.assertListEqual(unreachable, [])
+
+    def test_find_unreachable_hosts_empty(self) -> None:
+        """Test that no endpoints yields no unreachable hosts."""
+        self.assertListEqual(launcher.find_unreachable_hosts({}), [])
+
+    def test_apply_limit_exclusions(self) -> None:
+        """Test that unreachable hosts are excluded from all hosts."""
+        args = launcher.apply_limit_exclusions(["--check"], ["web2", "web3"])
+
+        self.assertListEqual(args, ["--check", "--limit", "all,!web2,!web3"])
+
+    def test_apply_limit_exclusions_existing_limit(self) -> None:
+        """Test that exclusions extend a limit requested by the caller."""
+        for limit_args, limit in (
+            (["--limit", "webservers"], "webservers,!web2"),
+            (["--limit=webservers"], "webservers,!web2"),
+            (["-l", "webservers"], "webservers,!web2"),
+            (["-lwebservers"], "webservers,!web2"),
+            (["-l", "web:db"], "web,db,!web2"),
+            (["-l", "web[1:3]:&prod"], "web[1:3],&prod,!web2"),
+        ):
+            args = launcher.apply_limit_exclusions(
+                ["--check"] + limit_args + ["-v"], ["web2"]
+            )
+
+            self.assertListEqual(args, ["--check", "-v", "--limit", limit])
+
+    def test_apply_limit_exclusions_no_hosts(self) -> None:
+        """Test that arguments are untouched when all hosts are reachable."""
+        args = launcher.apply_limit_exclusions(["-l", "webservers"], [])
+
+        self.assertListEqual(args, ["-l", "webservers"])
+
+    def test_ssh_args_use_proxy(self) -> None:
+        """Test that proxies and alternate ssh configs are detected in ssh arguments."""
+        for ssh_args in (
+            "-o ProxyJump=bastion",
+            "-oProxyCommand='ssh -W %h:%p bastion'",
+            "-J bastion",
+            "-F ./ssh_config",
+            "-o ProxyJump={{ bastion }}",
+        ):
+            self.assertTrue(launcher.ssh_args_use_proxy(ssh_args), ssh_args)
+
+        for ssh_args in ("", "-C -o ControlMaster=auto -o ControlPersist=60s"):
+            self.assertFalse(launcher.ssh_args_use_proxy(ssh_args), ssh_args)
+
+    def _preflight(self, mode: str, args: List[str]) -> List[str]:
+        """Run `preflight` against an inventory of local endpoints.
+
+        Args:
+            mode: The value of `RULES_ANSIBLE_PREFLIGHT`.
+            args: Arguments for `ansible-playbook`.
+
+        Returns:
+            The arguments returned by `preflight`.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            inventory = Path(tmp) / "hosts"
+            inventory.write_text(
+                "\n".join(
+                    [
+                        "[web]",
+                        f"web1 ansible_host=127.0.0.1 ansible_port={self._listening_port()}",
+                        f"web2 ansible_host=127.0.0.1 ansible_port={self._closed_port()}",
+                        "web3 ansible_host=127.0.0.1 ansible_port=1 "
+                        "ansible_ssh_common_args='-o ProxyJump=bastion'",
+                        "",
+                    ]
+                ),
+                encoding="utf-8",
+            )
+
+            env = {
+                "HOME": tmp,
+                "ANSIBLE_LOCAL_TEMP": str(Path(tmp) / ".ansible/tmp"),
+            }
+            with mock.patch.dict(
+                os.environ, {launcher.ENV_RULES_ANSIBLE_PREFLIGHT: mode}
+            ), mock.patch.object(
+                launcher, "get_inventory_hosts", return_value=inventory
+            ), mock.patch.object(
+                launcher, "ssh_config_may_redirect", return_value=False
+            ):
+                return launcher.preflight(args, env)
+
+    def test_preflight_fail(self) -> None:
+        """Test that `fail` mode exits when a host is unreachable."""
+        with self.assertRaises(SystemExit) as exc:
+            self._preflight("fail", ["--check"])
+
+        self.assertEqual(exc.exception.code, 4)
+
+    def test_preflight_exclude(self) -> None:
+        """Test that `exclude` mode excludes unreachable hosts but not proxied hosts."""
+        args = self._preflight("exclude", ["--check", "-l", "web"])
+
+        self.assertListEqual(args, ["--check", "--limit", "web,!web2"])
+
+
+class LaunchManifestTests(unittest.TestCase):
+    """Tests for loading the launch manifest of an `ansible_playbook` target."""
+
+    def setUp(self) -> None:
+        launcher.load_launch_manifest.cache_clear()
+
+    def tearDown(self) -> None:
+        launcher.load_launch_manifest.cache_clear()
+
+    def test_staged_paths(self) -> None:
+        """Test that staged files are resolved relative to the manifest."""
+        with tempfile.TemporaryDirectory() as tmp:
+            staging_dir = Path(tmp) / "_main/pkg/deploy.ansible"
+            staging_dir.mkdir(parents=True)
+            (staging_dir / "ansible_launch.json").write_text(
+                json.dumps(
+                    {
+                        "args": ["--diff"],
+                        "config": "ansible.cfg",
+                        "inventory_hosts": "inventories/prod/hosts",
+                        "package": "pkg",
+                        "playbook": "site.yml",
+                        "vault_files": ["vars.yml.vaultfile"],
+                    }
+                ),
+                encoding="utf-8",
+            )
+
+            with mock.patch.dict(
+                os.environ,
+                {
+                    "RUNFILES_DIR": tmp,
+                    launcher.ENV_ANSIBLE_BZL_LAUNCH_MANIFEST: (
+                        "_main/pkg/deploy.ansible/ansible_launch.json"
+                    ),
+                },
+            ):
+                self.assertEqual(launcher.get_playbook(), staging_dir / "site.yml")
+                self.assertEqual(
+                    launcher.get_inventory_hosts(),
+                    staging_dir / "inventories/prod/hosts",
+                )
+                self.assertEqual(
+                    launcher.get_ansible_config(), staging_dir / "ansible.cfg"
+                )
+                self.assertEqual(launcher.get_ansible_package(), "pkg")
+                self.assertListEqual(launcher.get_ansible_args(), ["--diff"])
+                self.assertListEqual(
+                    launcher.get_ansible_vault_files(),
+                    [staging_dir / "vars.yml.vaultfile"],
+                )
+
+    def test_plugin_env(self) -> None:
+        """Test that toolchain plugins are combined with the playbook's config."""
+        with tempfile.TemporaryDirectory() as tmp:
+            staging_dir = Path(tmp) / "_main/pkg/deploy.ansible"
+            staging_dir.mkdir(parents=True)
+            (staging_dir / "ansible_launch.json").write_text(
+                json.dumps(
+                    {
+                        "collections": [],
+                        "config": "ansible.cfg",
+                        "connection": "pipelined",
+                        "connection_plugins": [],
+                        "forks": None,
+                        "strategy": "mitogen_linear",
+                        "strategy_plugins": ["_main/plugins/strategy/fast.py"],
+                    }
+                ),
+                encoding="utf-8",
+            )
+            (staging_dir / "ansible.cfg").write_text(
+                "[defaults]\nstrategy = free\nstrategy_plugins = plugins\n",
+                encoding="utf-8",
+            )
+            strategy_dir = Path(tmp) / "_main/plugins/strategy"
+            strategy_dir.mkdir(parents=True)
+            (strategy_dir / "fast.py").write_text("", encoding="utf-8")
+
+            env = {
+                key: value
+                for key, value in os.environ.items()
+                if not key.startswith("ANSIBLE_")
+            }
+            env.update(
+                {
+                    "RUNFILES_DIR": tmp,
+                    launcher.ENV_ANSIBLE_BZL_LAUNCH_MANIFEST: (
+                        "_main/pkg/deploy.ansible/ansible_launch.json"
+                    ),
+                }
+            )
+            with mock.patch.dict(os.environ, env, clear=True):
+                ansible_env = launcher.get_ansible_env()
+
+            self.assertEqual(
+                ansible_env["ANSIBLE_STRATEGY_PLUGINS"],
+                os.pathsep.join([str(strategy_dir), str(staging_dir / "plugins")]),
+            )
+            self.assertNotIn("ANSIBLE_CONNECTION_PLUGINS", ansible_env)
+            self.assertNotIn("ANSIBLE_STRATEGY", ansible_env)
+            self.assertEqual(ansible_env["ANSIBLE_TRANSPORT"], "pipelined")
+
+    def test_manifest_next_to_executable(self) -> None:
+        """Test that the manifest is found without runfiles on manifest-only platforms."""
+        with tempfile.TemporaryDirectory() as tmp:
+            bin_dir = Path(tmp) / "bin/pkg"
+            staging_dir = bin_dir / "deploy.ansible"
+            staging_dir.mkdir(parents=True)
+            (staging_dir / "ansible_launch.json").write_text(
+                json.dumps({"package": "pkg"}), encoding="utf-8"
+            )
+            runfiles_manifest = bin_dir / "deploy.exe.runfiles_manifest"
+            runfiles_manifest.write_text("", encoding="utf-8")
+
+            env = dict(os.environ)
+            env.pop("RUNFILES_DIR", None)
+            env.update(
+                {
+                    "RUNFILES_MANIFEST_FILE": str(runfiles_manifest),
+                    launcher.ENV_ANSIBLE_BZL_LAUNCH_MANIFEST: (
+                        "_main/pkg/deploy.ansible/ansible_launch.json"
+                    ),
+                }
+            )
+            with mock.patch.dict(os.environ, env, clear=True), mock.patch.object(
+                launcher, "_rlocation", side_effect=AssertionError("runfiles loaded")
+            ):
+                self.assertEqual(launcher.get_ansible_package(), "pkg")
+
+    def test_find_runfiles_manifest_scan(self) -> None:
+        """Test that files and directories are located from a runfiles manifest."""
+        with tempfile.TemporaryDirectory() as tmp:
+            runfiles_manifest = Path(tmp) / "deploy.runfiles_manifest"
+            runfiles_manifest.write_text(
+                "\n".join(
+                    [
+                        "_main/pkg/other.txt /src/pkg/other.txt",
+                        "collections/ansible_collections/ns/name/MANIFEST.json "
+                        "/ext/collections/ansible_collections/ns/name/MANIFEST.json",
+                        "plugins/strategy/fast.py /ext/plugins/strategy/fast.py",
+                        "",
+                    ]
+                ),
+                encoding="utf-8",
+            )
+
+            env = dict(os.environ)
+            env.pop("RUNFILES_DIR", None)
+            env["RUNFILES_MANIFEST_FILE"] = str(runfiles_manifest)
+            with mock.patch.dict(os.environ, env, clear=True), mock.patch.object(
+                launcher, "_rlocation", side_effect=AssertionError("runfiles loaded")
+            ):
+                self.assertListEqual(
+                    launcher.find_runfiles(
+                        [
+                            "plugins/strategy/fast.py",
+                            "collections/ansible_collections",
+                        ]
+                    ),
+                    [
+                        Path("/ext/plugins/strategy/fast.py"),
+                        Path("/ext/collections/ansible_collections"),
+                    ],
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
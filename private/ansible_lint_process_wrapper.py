@@ -9,11 +9,14 @@ import tempfile
 from pathlib import Path
 from typing import Dict, Iterable, Optional, Sequence
 
+import private.ansible_memprofile as memprofile
+import private.ansible_settings as ansible_settings
 from ansiblelint.file_utils import Lintable
 from python.runfiles import Runfiles
 
 ANSIBLE_LINT_ARGS_FILE = "ANSIBLE_LINT_ARGS_FILE"
 ANSIBLE_LINT_ENTRY_POINT = "ANSIBLE_LINT_ENTRY_POINT"
+ANSIBLE_BZL_PYTHON = "ANSIBLE_BZL_PYTHON"
 RUNFILES: Optional[Runfiles] = None
 
 
@@ -96,6 +99,11 @@ def parse_args(argv: Optional[Sequence[str]]) -> argparse.Namespace:
         type=Path,
         help="An optional output file to produce",
     )
+    parser.add_argument(
+        "--memprofile_output",
+        type=Path,
+        help="An optional path to write a memory profile to when `RULES_ANSIBLE_MEMPROFILE` is set.",
+    )
     parser.add_argument(
         # This argument is used for sanitizing logs
         "--package",
@@ -121,6 +129,20 @@ def parse_args(argv: Optional[Sequence[str]]) -> argparse.Namespace:
         required=True,
         help="The ansible-lint config file.",
     )
+    parser.add_argument(
+        "--entrypoints_dir",
+        type=file_type,
+        required=True,
+        help="The directory containing ansible executables required by ansible-lint.",
+    )
+    parser.add_argument(
+        "--collections_path",
+        dest="collections_paths",
+        type=file_type,
+        action="append",
+        default=[],
+        help="A directory containing vendored `ansible_collections`.",
+    )
     parser.add_argument(
         "lint_args",
         nargs="*",
@@ -148,48 +170,21 @@ def parse_args(argv: Optional[Sequence[str]]) -> argparse.Namespace:
     return args
 
 
-def load_entrypoints() -> Dict[str, str]:
-    """Load entrypoints files into a dict
+def find_entrypoints_dir() -> Path:
+    """Locate the prebuilt ansible executables in runfiles.
 
     Returns:
-        A mapping of entrypoints to their text contents.
+        The directory containing the executables.
     """
-    entrypoints = {
-        "ansible-config": "private/scripts/ansible_config.py",
-        "ansible-doc": "private/scripts/ansible_doc.py",
-        "ansible-galaxy": "private/scripts/ansible_galaxy.py",
-        "ansible-playbook": "private/scripts/ansible_playbook.py",
-        "ansible": "private/scripts/ansible.py",
-    }
-
-    # Convert to runfiles path
-    if is_test():
-        try:
-            return {
-                name: _rlocation(f"rules_ansible/{path}").read_text(encoding="utf-8")
-                for name, path in entrypoints.items()
-            }
-        except FileNotFoundError:
-            return {
-                name: _rlocation(f"_main/{path}").read_text(encoding="utf-8")
-                for name, path in entrypoints.items()
-            }
-
-    return {
-        name: _execpath(path).read_text(encoding="utf-8")
-        for name, path in entrypoints.items()
-    }
-
-
-def write_entrypoint(path: Path, content: str) -> None:
-    """A helper function for writing executable files
+    global RUNFILES
+    if not RUNFILES:
+        RUNFILES = Runfiles.Create()
 
-    Args:
-        path: The path of the file.
-        content: Content to write.
-    """
-    path.write_text(content, encoding="utf-8")
-    path.chmod(0o700)
+    entrypoint = "private/ansible_lint_entrypoints/ansible-playbook"
+    try:
+        return _rlocation(f"rules_ansible/{entrypoint}").parent
+    except FileNotFoundError:
+        return _rlocation(f"_main/{entrypoint}").parent
 
 
 def lint_main(
@@ -197,6 +192,8 @@ def lint_main(
     capture_output: bool = True,
     args: Iterable[str] = [],
     temp_dir: Optional[Path] = None,
+    memprofile_output: Optional[Path] = None,
+    entrypoints_dir: Optional[Path] = None,
 ) -> subprocess.CompletedProcess:
     """The entrypoint for running `ansible-lint` in a Bazel action or test.
 
@@ -207,6 +204,10 @@ def lint_main(
         args: Arguments to pass to ansible-lint
         temp_dir: An optional base directory to use for writing files required by
             linting. if not set, a temporary directory will be generated separately.
+        memprofile_output: An optional path to write a memory profile to when
+            `RULES_ANSIBLE_MEMPROFILE` is set.
+        entrypoints_dir: The directory containing ansible executables. If not set,
+            the executables will be located in runfiles.
 
     Returns:
         The results of the ansible-lint `subprocess.run`.
@@ -217,39 +218,37 @@ def lint_main(
         str(temp_dir) if temp_dir else os.environ.get("TEST_TMPDIR", str(Path.cwd()))
     )
 
-    # Create a directory to append to `PATH`
-    tmp_path = Path(tempfile.mkdtemp(dir=dir_prefix)) / "_fakepath"
-    tmp_path.mkdir(exist_ok=True, parents=True)
+    # Create a directory to use as `HOME`
+    tmp_path = Path(tempfile.mkdtemp(dir=dir_prefix))
 
-    for tool, content in load_entrypoints().items():
-        entrypoint_content = "\n".join(
-            [
-                f"#!{sys.executable}",
-                content,
-            ]
-        )
-
-        write_entrypoint(tmp_path / tool, entrypoint_content)
+    if not entrypoints_dir:
+        entrypoints_dir = find_entrypoints_dir()
 
     env = dict(os.environ)
     if additional_env:
         env.update(additional_env)
 
-    sys_path = str(tmp_path) + os.pathsep + env.get("PATH", "")
+    sys_path = str(entrypoints_dir) + os.pathsep + env.get("PATH", "")
     env.update(
         {
             "HOME": str(tmp_path),
+            ANSIBLE_BZL_PYTHON: sys.executable,
             ANSIBLE_LINT_ENTRY_POINT: __file__,
             "PATH": sys_path,
         }
     )
 
+    report_dir = tmp_path / "memprofile"
+    if memprofile_output and memprofile.is_enabled():
+        report_dir.mkdir()
+        env.update(memprofile.child_env(report_dir))
+
     lint_args = [
         sys.executable,
         __file__,
     ] + args
 
-    return subprocess.run(
+    proc = subprocess.run(
         lint_args,
         env=env,
         check=False,
@@ -257,6 +256,34 @@ def lint_main(
         stderr=subprocess.STDOUT if capture_output else None,
     )
 
+    if memprofile_output and memprofile.is_enabled():
+        memprofile.write_report(
+            memprofile_output, "ansible_lint_process_wrapper", report_dir
+        )
+
+    return proc
+
+
+def get_memprofile_output(args: argparse.Namespace) -> Optional[Path]:
+    """Determine where to write memory profiling reports.
+
+    Args:
+        args: Parsed command line arguments.
+
+    Returns:
+        The requested output, a path in the test's undeclared outputs or `None`.
+    """
+    if args.memprofile_output:
+        return args.memprofile_output
+
+    if "TEST_UNDECLARED_OUTPUTS_DIR" in os.environ:
+        return (
+            Path(os.environ["TEST_UNDECLARED_OUTPUTS_DIR"])
+            / "ansible_lint.memprofile.json"
+        )
+
+    return None
+
 
 def main() -> None:
     """The main entrypoint of the script"""
@@ -272,12 +299,28 @@ def main() -> None:
         argv = args_file.read_text(encoding="utf-8").splitlines()
     args = parse_args(argv)
 
-    env = {
-        "ANSIBLE_CONFIG": str(args.config_file),
-        "ANSIBLE_PLAYBOOK_DIR": str(args.playbook.parent),
-    }
+    env = dict(os.environ)
+    env.update(
+        {
+            "ANSIBLE_CONFIG": str(args.config_file),
+            "ANSIBLE_PLAYBOOK_DIR": str(args.playbook.parent),
+        }
+    )
+
+    # Vendored collections are searched before any configured by the playbook.
+    ansible_settings.prepend_paths(
+        env,
+        args.config_file,
+        ansible_settings.COLLECTIONS_PATH,
+        args.collections_paths,
+    )
 
-    proc = lint_main(args=args.lint_args, additional_env=env)
+    proc = lint_main(
+        args=args.lint_args,
+        additional_env=env,
+        memprofile_output=get_memprofile_output(args),
+        entrypoints_dir=args.entrypoints_dir,
+    )
 
     if proc.returncode:
         stdout = proc.stdout.decode(encoding="utf-8")
@@ -316,6 +359,8 @@ def ansible_main() -> None:
 
     ansiblelint.file_utils.Lintable = AnsibleLintable
 
+    memprofile.install_child_hooks("ansible-lint")
+
     from ansiblelint.__main__ import _run_cli_entrypoint
 
     _run_cli_entrypoint()
@@ -22,7 +22,10 @@ def main() -> None:
 
     with tempfile.TemporaryDirectory() as tmp_dir:
         proc = ansible_lint.lint_main(
-            capture_output=False, args=sys.argv[1:], temp_dir=Path(tmp_dir)
+            capture_output=False,
+            args=sys.argv[1:],
+            temp_dir=Path(tmp_dir),
+            memprofile_output=Path.cwd() / "ansible_lint.memprofile.json",
         )
 
     sys.exit(proc.returncode)
@@ -0,0 +1,240 @@
+"""Peak memory and allocation instrumentation for ansible processes.
+
+Instrumentation is enabled by setting `RULES_ANSIBLE_MEMPROFILE` to `1` to
+record the peak RSS of processes or to `tracemalloc` (optionally followed by
+`:<count>`) to additionally record the top allocation sites of the ansible or
+ansible-lint child process.
+
+Each instrumented process writes its own report to the directory given by
+`RULES_ANSIBLE_MEMPROFILE_REPORT_DIR` and the reports are assembled into a
+process tree by `write_report`. Processes forked by ansible for each host exit
+without running exit handlers so they are not reported individually. Their
+usage is reflected in `children_peak_rss_bytes` of the forking process, which
+is the largest peak RSS of any of its terminated and waited for children.
+
+Running this script with the path to a python entrypoint installs the child
+instrumentation into the current interpreter and then runs the entrypoint.
+"""
+
+import atexit
+import json
+import os
+import runpy
+import sys
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ENV_RULES_ANSIBLE_MEMPROFILE = "RULES_ANSIBLE_MEMPROFILE"
+ENV_RULES_ANSIBLE_MEMPROFILE_REPORT_DIR = "RULES_ANSIBLE_MEMPROFILE_REPORT_DIR"
+
+# The default number of allocation sites to report.
+DEFAULT_TRACEMALLOC_LIMIT = 25
+
+# Whether or not `install_child_hooks` has run in this process.
+_HOOKS_INSTALLED = False
+
+
+def is_enabled() -> bool:
+    """Determine whether or not memory profiling was requested.
+
+    Returns:
+        True if `RULES_ANSIBLE_MEMPROFILE` is set.
+    """
+    value = os.getenv(ENV_RULES_ANSIBLE_MEMPROFILE)
+    return bool(value) and value not in ("0", "false", "False")
+
+
+def tracemalloc_limit() -> int:
+    """Return the number of allocation sites to report.
+
+    Returns:
+        The number of sites or `0` if allocation tracing was not requested.
+    """
+    value = os.getenv(ENV_RULES_ANSIBLE_MEMPROFILE, "")
+    mode, _, count = value.partition(":")
+    if mode != "tracemalloc":
+        return 0
+    if count:
+        return int(count)
+    return DEFAULT_TRACEMALLOC_LIMIT
+
+
+def _peak_rss(children: bool = False) -> Optional[int]:
+    """Return the peak resident set size of this process or its waited on children.
+
+    Args:
+        children: Whether to report on children instead of the current process.
+
+    Returns:
+        The peak RSS in bytes or `None` if it cannot be determined on this platform.
+    """
+    try:
+        # pylint: disable-next=import-outside-toplevel
+        import resource
+    except ImportError:
+        return None
+
+    usage = resource.getrusage(
+        resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    )
+
+    # macOS reports bytes where Linux reports kilobytes.
+    if sys.platform == "darwin":
+        return usage.ru_maxrss
+    return usage.ru_maxrss * 1024
+
+
+def process_report(name: str) -> Dict[str, Any]:
+    """Collect memory statistics about the current process.
+
+    Args:
+        name: A name identifying the process.
+
+    Returns:
+        A JSON serializable report.
+    """
+    return {
+        "name": name,
+        "pid": os.getpid(),
+        "ppid": os.getppid(),
+        "peak_rss_bytes": _peak_rss(),
+        "children_peak_rss_bytes": _peak_rss(children=True),
+    }
+
+
+def top_allocations(limit: int) -> List[Dict[str, Any]]:
+    """Summarize the largest live allocation sites recorded by `tracemalloc`.
+
+    Args:
+        limit: The number of sites to report.
+
+    Returns:
+        A JSON serializable list of allocation sites.
+    """
+    if not tracemalloc.is_tracing():
+        return []
+
+    snapshot = tracemalloc.take_snapshot()
+    allocations = []
+    for stat in snapshot.statistics("lineno")[:limit]:
+        frame = stat.traceback[0]
+        allocations.append(
+            {
+                "file": frame.filename,
+                "line": frame.lineno,
+                "size_bytes": stat.size,
+                "count": stat.count,
+            }
+        )
+    return allocations
+
+
+def install_child_hooks(name: str) -> None:
+    """Record memory statistics of the current process when it exits.
+
+    This is a no-op unless a parent process requested reports through
+    `RULES_ANSIBLE_MEMPROFILE_REPORT_DIR` or hooks were already installed.
+
+    Args:
+        name: A name identifying the process.
+    """
+    global _HOOKS_INSTALLED  # pylint: disable=global-statement
+
+    report_dir = os.getenv(ENV_RULES_ANSIBLE_MEMPROFILE_REPORT_DIR)
+    if not report_dir or _HOOKS_INSTALLED:
+        return
+    _HOOKS_INSTALLED = True
+
+    limit = tracemalloc_limit()
+    if limit:
+        tracemalloc.start()
+
+    pid = os.getpid()
+
+    def _write_report() -> None:
+        # Forked workers inherit exit handlers but only the original process should report.
+        if os.getpid() != pid:
+            return
+        report = process_report(name)
+        peak_traced = tracemalloc.get_traced_memory()[1] if limit else None
+        report["tracemalloc_peak_bytes"] = peak_traced
+        report["top_allocations"] = top_allocations(limit)
+        Path(report_dir, f"{pid}.json").write_text(
+            json.dumps(report, indent=4), encoding="utf-8"
+        )
+
+    atexit.register(_write_report)
+
+
+def child_env(report_dir: Path) -> Dict[str, str]:
+    """Return environment variables requesting reports from descendant processes.
+
+    Args:
+        report_dir: The directory descendants should write their reports to.
+
+    Returns:
+        Environment variables to set for children.
+    """
+    return {ENV_RULES_ANSIBLE_MEMPROFILE_REPORT_DIR: str(report_dir)}
+
+
+def _nest_reports(
+    parent: Dict[str, Any], reports: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Attach reports to the report of their parent process.
+
+    Args:
+        parent: The report to attach children to.
+        reports: All reports of descendant processes.
+
+    Returns:
+        The parent report.
+    """
+    parent["children"] = [
+        _nest_reports(report, reports)
+        for report in reports
+        if report.get("ppid") == parent["pid"]
+    ]
+    return parent
+
+
+def write_report(output: Path, name: str, report_dir: Path) -> None:
+    """Write a report for the current process and all instrumented descendants.
+
+    Args:
+        output: The path of the JSON report to write.
+        name: A name identifying the current process.
+        report_dir: The directory descendants wrote reports to through `install_child_hooks`.
+    """
+    reports = [
+        json.loads(path.read_text(encoding="utf-8"))
+        for path in sorted(report_dir.glob("*.json"))
+    ]
+    report = _nest_reports(process_report(name), reports)
+
+    # Descendants whose parent was not instrumented (e.g. a shell) are attached
+    # to this process.
+    pids = {child["pid"] for child in reports}
+    report["children"].extend(
+        _nest_reports(child, reports)
+        for child in reports
+        if child.get("ppid") != report["pid"] and child.get("ppid") not in pids
+    )
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=4) + "\n", encoding="utf-8")
+
+
+def main() -> None:
+    """The main entrypoint of the script."""
+    if len(sys.argv) < 2:
+        raise ValueError("Usage: ansible_memprofile.py <entrypoint> [args...]")
+
+    sys.argv = sys.argv[1:]
+    install_child_hooks(Path(sys.argv[0]).stem)
+    runpy.run_path(sys.argv[0], run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Tests for ansible memory instrumentation."""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+from typing import Any, Dict
+
+import private.ansible_memprofile as memprofile
+
+# A script which instruments itself, forks and spawns an instrumented child.
+_PARENT_SCRIPT = textwrap.dedent(
+    """\
+    import os
+    import subprocess
+    import sys
+
+    import private.ansible_memprofile as memprofile
+
+    memprofile.install_child_hooks("parent")
+
+    # Forked workers must not write reports of their own.
+    pid = os.fork()
+    if pid == 0:
+        sys.exit(0)
+    os.waitpid(pid, 0)
+
+    subprocess.run([sys.executable, sys.argv[1], sys.argv[2]], check=True)
+    """
+)
+
+# A script run through the memory profiling shim.
+_CHILD_SCRIPT = textwrap.dedent(
+    """\
+    data = bytearray(1024 * 1024)
+    """
+)
+
+
+class MemprofileTests(unittest.TestCase):
+    """Tests for collecting reports from instrumented processes."""
+
+    def setUp(self) -> None:
+        # pylint: disable-next=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.report_dir = self.tmp_path / "reports"
+        self.report_dir.mkdir()
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _read_report(self, output: Path) -> Dict[str, Any]:
+        return json.loads(output.read_text(encoding="utf-8"))
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_process_tree(self) -> None:
+        """Test that each instrumented descendant is reported under its parent."""
+        parent = self.tmp_path / "parent.py"
+        parent.write_text(_PARENT_SCRIPT, encoding="utf-8")
+        child = self.tmp_path / "ansible-child"
+        child.write_text(_CHILD_SCRIPT, encoding="utf-8")
+
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(sys.path)
+        env.update(memprofile.child_env(self.report_dir))
+
+        subprocess.run(
+            [sys.executable, str(parent), memprofile.__file__, str(child)],
+            env=env,
+            check=True,
+        )
+
+        self.assertEqual(len(list(self.report_dir.glob("*.json"))), 2)
+
+        output = self.tmp_path / "memprofile.json"
+        memprofile.write_report(output, "test", self.report_dir)
+        report = self._read_report(output)
+
+        self.assertEqual(report["name"], "test")
+        self.assertEqual(len(report["children"]), 1)
+
+        parent_report = report["children"][0]
+        self.assertEqual(parent_report["name"], "parent")
+        self.assertEqual(parent_report["ppid"], os.getpid())
+        self.assertEqual(len(parent_report["children"]), 1)
+
+        child_report = parent_report["children"][0]
+        self.assertEqual(child_report["name"], "ansible-child")
+        self.assertEqual(child_report["ppid"], parent_report["pid"])
+        self.assertListEqual(child_report["children"], [])
+
+    def test_orphaned_reports(self) -> None:
+        """Test that descendants of uninstrumented processes are attached to the root."""
+        for pid, ppid in ((1000001, 1000000), (1000002, 1000001)):
+            (self.report_dir / f"{pid}.json").write_text(
+                json.dumps({"name": str(pid), "pid": pid, "ppid": ppid}),
+                encoding="utf-8",
+            )
+
+        output = self.tmp_path / "memprofile.json"
+        memprofile.write_report(output, "test", self.report_dir)
+        report = self._read_report(output)
+
+        self.assertEqual(len(report["children"]), 1)
+        self.assertEqual(report["children"][0]["pid"], 1000001)
+        self.assertEqual(report["children"][0]["children"][0]["pid"], 1000002)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,227 @@
+"""Utilities for combining rules_ansible settings with ansible's own configuration.
+
+Ansible gives environment variables precedence over `ansible.cfg` so settings
+provided by the ansible toolchain are merged with the value ansible would
+otherwise use rather than exported as is.
+"""
+
+import configparser
+import os
+import stat
+from pathlib import Path
+from typing import Dict, List, Mapping, MutableMapping, NamedTuple, Optional, Sequence
+
+
+class Setting(NamedTuple):
+    """An ansible configuration setting."""
+
+    env: str
+    """The environment variable of the setting."""
+
+    key: str
+    """The key of the setting in the `[defaults]` section of `ansible.cfg`."""
+
+    default: Sequence[str] = ()
+    """Default search paths relative to `ANSIBLE_HOME` or absolute paths."""
+
+
+COLLECTIONS_PATH = Setting(
+    env="ANSIBLE_COLLECTIONS_PATH",
+    key="collections_path",
+    default=("collections", "/usr/share/ansible/collections"),
+)
+CONNECTION_PLUGINS = Setting(
+    env="ANSIBLE_CONNECTION_PLUGINS",
+    key="connection_plugins",
+    default=("plugins/connection", "/usr/share/ansible/plugins/connection"),
+)
+STRATEGY_PLUGINS = Setting(
+    env="ANSIBLE_STRATEGY_PLUGINS",
+    key="strategy_plugins",
+    default=("plugins/strategy", "/usr/share/ansible/plugins/strategy"),
+)
+FILTER_PLUGINS = Setting(
+    env="ANSIBLE_FILTER_PLUGINS",
+    key="filter_plugins",
+    default=("plugins/filter", "/usr/share/ansible/plugins/filter"),
+)
+TEST_PLUGINS = Setting(
+    env="ANSIBLE_TEST_PLUGINS",
+    key="test_plugins",
+    default=("plugins/test", "/usr/share/ansible/plugins/test"),
+)
+STRATEGY = Setting(env="ANSIBLE_STRATEGY", key="strategy")
+TRANSPORT = Setting(env="ANSIBLE_TRANSPORT", key="transport")
+ANSIBLE_HOME = Setting(env="ANSIBLE_HOME", key="home")
+
+
+def find_config_file(env: Mapping[str, str]) -> Optional[Path]:
+    """Locate the config file ansible will load.
+
+    Args:
+        env: The environment ansible will be run with.
+
+    Returns:
+        The first of `ANSIBLE_CONFIG`, `./ansible.cfg`, `~/.ansible.cfg` and
+        `/etc/ansible/ansible.cfg` which exists.
+    """
+    candidates = []
+    if env.get("ANSIBLE_CONFIG"):
+        config = Path(os.path.expanduser(env["ANSIBLE_CONFIG"]))
+        candidates.append(config / "ansible.cfg" if config.is_dir() else config)
+
+    # Ansible ignores config files in world writable working directories.
+    try:
+        if not Path.cwd().stat().st_mode & stat.S_IWOTH:
+            candidates.append(Path.cwd() / "ansible.cfg")
+    except OSError:
+        pass
+
+    candidates.extend(
+        [Path("~/.ansible.cfg").expanduser(), Path("/etc/ansible/ansible.cfg")]
+    )
+
+    for candidate in candidates:
+        if candidate.is_file():
+            return candidate
+
+    return None
+
+
+def load_config(config_file: Optional[Path]) -> Dict[str, str]:
+    """Load the `[defaults]` section of an ansible config file.
+
+    Args:
+        config_file: The ansible config file, if any.
+
+    Returns:
+        The settings of the `[defaults]` section.
+    """
+    if not config_file or not config_file.exists():
+        return {}
+
+    config = configparser.ConfigParser(interpolation=None, strict=False)
+
+    # Ansible config keys are case sensitive.
+    config.optionxform = str  # type: ignore
+
+    config.read_string(config_file.read_text(encoding="utf-8"), source=str(config_file))
+    if not config.has_section("defaults"):
+        return {}
+    return dict(config.items("defaults"))
+
+
+def _resolve_path(path: str, base_dir: Optional[Path]) -> str:
+    """Resolve a path from a config file the way ansible does.
+
+    Args:
+        path: The configured path.
+        base_dir: The directory relative paths are resolved against.
+
+    Returns:
+        The resolved path.
+    """
+    resolved = Path(os.path.expandvars(os.path.expanduser(path)))
+    if not resolved.is_absolute() and base_dir:
+        resolved = base_dir / resolved
+    return str(resolved)
+
+
+def configured_paths(
+    setting: Setting,
+    env: Mapping[str, str],
+    config_file: Optional[Path],
+) -> List[str]:
+    """Return the search paths ansible will use for a path setting.
+
+    Args:
+        setting: The setting to look up.
+        env: The environment ansible will be run with.
+        config_file: The ansible config file ansible will be run with.
+
+    Returns:
+        The configured search paths or ansible's defaults.
+    """
+    if env.get(setting.env):
+        return env[setting.env].split(os.pathsep)
+
+    config = load_config(config_file)
+    base_dir = config_file.parent if config_file else None
+    if config.get(setting.key):
+        return [
+            _resolve_path(path, base_dir)
+            for path in config[setting.key].split(os.pathsep)
+            if path
+        ]
+
+    home = env.get(ANSIBLE_HOME.env)
+    if not home and config.get(ANSIBLE_HOME.key):
+        home = _resolve_path(config[ANSIBLE_HOME.key], base_dir)
+    if not home:
+        home = "~/.ansible"
+
+    return [
+        path if os.path.isabs(path) else f"{home}/{path}" for path in setting.default
+    ]
+
+
+def prepend_paths(
+    env: MutableMapping[str, str],
+    config_file: Optional[Path],
+    setting: Setting,
+    paths: Sequence[Path],
+) -> None:
+    """Add search paths in front of those ansible is configured to use.
+
+    Args:
+        env: The environment ansible will be run with. This is updated in place.
+        config_file: The ansible config file ansible will be run with.
+        setting: The path setting to update.
+        paths: The paths to add.
+    """
+    if not paths:
+        return
+
+    existing = configured_paths(setting, env, config_file)
+    env[setting.env] = os.pathsep.join([str(path) for path in paths] + existing)
+
+
+def configured_value(
+    setting: Setting,
+    env: Mapping[str, str],
+    config_file: Optional[Path],
+) -> Optional[str]:
+    """Return the value ansible will use for a setting without applying defaults.
+
+    Args:
+        setting: The setting to look up.
+        env: The environment ansible will be run with.
+        config_file: The ansible config file ansible will be run with.
+
+    Returns:
+        The value from the environment or config file, if set.
+    """
+    if env.get(setting.env):
+        return env[setting.env]
+
+    return load_config(config_file).get(setting.key) or None
+
+
+def set_default(
+    env: MutableMapping[str, str],
+    config_file: Optional[Path],
+    setting: Setting,
+    value: Optional[str],
+) -> None:
+    """Set a setting only if neither the environment nor config file set it.
+
+    Args:
+        env: The environment ansible will be run with. This is updated in place.
+        config_file: The ansible config file ansible will be run with.
+        setting: The setting to update.
+        value: The default value.
+    """
+    if not value or configured_value(setting, env, config_file):
+        return
+
+    env[setting.env] = value
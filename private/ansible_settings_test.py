@@ -0,0 +1,130 @@
+"""Tests for combining toolchain settings with ansible's configuration."""
+
+import os
+import tempfile
+import textwrap
+import unittest
+from pathlib import Path
+from typing import Dict
+
+import private.ansible_settings as ansible_settings
+
+
+class PrependPathsTests(unittest.TestCase):
+    """Tests for adding search paths to those ansible is configured with."""
+
+    def setUp(self) -> None:
+        # pylint: disable-next=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp_dir.name)
+        self.config = self.tmp_path / "ansible.cfg"
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _prepend(self, env: Dict[str, str]) -> str:
+        ansible_settings.prepend_paths(
+            env,
+            self.config,
+            ansible_settings.COLLECTIONS_PATH,
+            [Path("/vendored")],
+        )
+        return env[ansible_settings.COLLECTIONS_PATH.env]
+
+    def test_defaults(self) -> None:
+        """Test that ansible's default paths are kept when nothing is configured."""
+        self.assertEqual(
+            self._prepend({}),
+            os.pathsep.join(
+                [
+                    "/vendored",
+                    "~/.ansible/collections",
+                    "/usr/share/ansible/collections",
+                ]
+            ),
+        )
+
+    def test_ansible_home(self) -> None:
+        """Test that default paths follow `ANSIBLE_HOME`."""
+        self.assertEqual(
+            self._prepend({"ANSIBLE_HOME": "/home"}),
+            os.pathsep.join(
+                ["/vendored", "/home/collections", "/usr/share/ansible/collections"]
+            ),
+        )
+
+    def test_config_file(self) -> None:
+        """Test that paths from `ansible.cfg` are kept relative to the file."""
+        self.config.write_text(
+            textwrap.dedent(
+                """\
+                [defaults]
+                collections_path = collections:/opt/collections
+                """
+            ),
+            encoding="utf-8",
+        )
+        self.assertEqual(
+            self._prepend({}),
+            os.pathsep.join(
+                ["/vendored", str(self.tmp_path / "collections"), "/opt/collections"]
+            ),
+        )
+
+    def test_environment(self) -> None:
+        """Test that paths from the environment take precedence over `ansible.cfg`."""
+        self.config.write_text(
+            "[defaults]\ncollections_path = /opt/collections\n", encoding="utf-8"
+        )
+        self.assertEqual(
+            self._prepend({"ANSIBLE_COLLECTIONS_PATH": "/env/collections"}),
+            os.pathsep.join(["/vendored", "/env/collections"]),
+        )
+
+    def test_no_paths(self) -> None:
+        """Test that the environment is left alone when there is nothing to add."""
+        env: Dict[str, str] = {}
+        ansible_settings.prepend_paths(
+            env, self.config, ansible_settings.COLLECTIONS_PATH, []
+        )
+        self.assertDictEqual(env, {})
+
+
+class SetDefaultTests(unittest.TestCase):
+    """Tests for settings which only apply when ansible leaves them unset."""
+
+    def setUp(self) -> None:
+        # pylint: disable-next=consider-using-with
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = Path(self.tmp_dir.name) / "ansible.cfg"
+
+    def tearDown(self) -> None:
+        self.tmp_dir.cleanup()
+
+    def _set_default(self, env: Dict[str, str]) -> Dict[str, str]:
+        ansible_settings.set_default(
+            env, self.config, ansible_settings.STRATEGY, "mitogen_linear"
+        )
+        return env
+
+    def test_unset(self) -> None:
+        """Test that the default is used when nothing selects a strategy."""
+        self.assertDictEqual(
+            self._set_default({}), {"ANSIBLE_STRATEGY": "mitogen_linear"}
+        )
+
+    def test_config_file(self) -> None:
+        """Test that a strategy from `ansible.cfg` is kept."""
+        self.config.write_text("[defaults]\nstrategy = free\n", encoding="utf-8")
+        self.assertDictEqual(self._set_default({}), {})
+
+    def test_environment(self) -> None:
+        """Test that a strategy from the environment is kept."""
+        self.assertDictEqual(
+            self._set_default({"ANSIBLE_STRATEGY": "free"}),
+            {"ANSIBLE_STRATEGY": "free"},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
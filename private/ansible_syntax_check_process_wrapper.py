@@ -0,0 +1,173 @@
+"""A process wrapper for running `ansible-playbook --syntax-check` in a Bazel action."""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import private.ansible_settings as ansible_settings
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    Args:
+        argv: An optional set of args to use instead of `sys.argv[1:]`
+
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--output",
+        type=Path,
+        required=True,
+        help="The output file to produce on success.",
+    )
+    parser.add_argument(
+        # This argument is used for sanitizing logs
+        "--package",
+        type=str,
+        required=True,
+        help="The package of the playbook target being checked.",
+    )
+    parser.add_argument(
+        "--playbook",
+        type=Path,
+        required=True,
+        help="The ansible playbook to check.",
+    )
+    parser.add_argument(
+        "--inventory",
+        type=Path,
+        required=True,
+        help="The inventory `hosts` file for the playbook.",
+    )
+    parser.add_argument(
+        "--config_file",
+        type=Path,
+        required=True,
+        help="The ansible config file.",
+    )
+    parser.add_argument(
+        "--collections_path",
+        dest="collections_paths",
+        type=Path,
+        action="append",
+        default=[],
+        help="A directory containing vendored `ansible_collections`.",
+    )
+
+    return parser.parse_args(argv)
+
+
+def syntax_check(
+    playbook: Path,
+    inventory: Path,
+    config_file: Path,
+    home: Path,
+    collections_paths: Sequence[Path] = (),
+) -> Tuple[int, str]:
+    """Run `ansible-playbook --syntax-check` within the current interpreter.
+
+    Running in-process avoids paying for a second interpreter startup and
+    the `ansible` import on top of the one already paid by this wrapper.
+
+    Args:
+        playbook: The playbook to check.
+        inventory: The inventory `hosts` file.
+        config_file: The ansible config file.
+        home: A writable directory to use as `HOME` for ansible.
+        collections_paths: Directories containing vendored `ansible_collections`.
+
+    Returns:
+        The exit code and combined output of `ansible-playbook`.
+    """
+    # Ansible reads its configuration at import time so the environment
+    # must be fully set up before any `ansible` modules are loaded.
+    os.environ.update(
+        {
+            "ANSIBLE_CONFIG": str(config_file.absolute()),
+            "ANSIBLE_LOCAL_TEMP": str(home / ".ansible/tmp"),
+            "ANSIBLE_NOCOLOR": "1",
+            "ANSIBLE_RETRY_FILES_ENABLED": "False",
+            "HOME": str(home),
+        }
+    )
+
+    # Vendored collections are searched before any configured by the playbook.
+    ansible_settings.prepend_paths(
+        os.environ,
+        config_file.absolute(),
+        ansible_settings.COLLECTIONS_PATH,
+        [path.absolute() for path in collections_paths],
+    )
+
+    args: List[str] = [
+        "ansible-playbook",
+        "--syntax-check",
+        f"--inventory={inventory.absolute()}",
+        str(playbook.absolute()),
+    ]
+
+    # Ansible's `Display` writes to the underlying binary buffers of the standard
+    # streams so output must be captured with a real file rather than `StringIO`.
+    exit_code = 0
+    with tempfile.TemporaryFile() as capture:
+        stream = io.TextIOWrapper(
+            capture, encoding="utf-8", errors="replace", write_through=True
+        )
+        with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+            try:
+                # Importing ansible may exit the process if it fails to initialize.
+                # pylint: disable-next=import-outside-toplevel
+                from ansible.cli.playbook import main as ansible_playbook_main
+
+                ansible_playbook_main(args)
+            except SystemExit as exc:
+                if isinstance(exc.code, int):
+                    exit_code = exc.code
+                elif exc.code is not None:
+                    print(exc.code)
+                    exit_code = 1
+
+        stream.flush()
+        stream.detach()
+        capture.seek(0)
+        output = capture.read().decode("utf-8", errors="replace")
+
+    return exit_code, output
+
+
+def main() -> None:
+    """The main entrypoint of the script."""
+    if "RULES_ANSIBLE_DEBUG" in os.environ:
+        logging.basicConfig(level=logging.DEBUG)
+
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory(dir=Path.cwd()) as tmp_dir:
+        exit_code, output = syntax_check(
+            playbook=args.playbook,
+            inventory=args.inventory,
+            config_file=args.config_file,
+            home=Path(tmp_dir),
+            collections_paths=args.collections_paths,
+        )
+
+    if exit_code:
+        output = output.replace(str(args.playbook.parent.absolute()), args.package)
+        print(output, file=sys.stderr)
+        sys.exit(exit_code)
+
+    args.output.write_bytes(b"")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Tests for the `ansible-playbook --syntax-check` process wrapper."""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List
+
+import private.ansible_syntax_check_process_wrapper as wrapper
+from python.runfiles import Runfiles
+
+
+def _rlocation(runfiles: Runfiles, path: str) -> Path:
+    """Look up a runfile from the current workspace.
+
+    Args:
+        runfiles: The runfiles of the test.
+        path: The workspace relative path of the runfile.
+
+    Returns:
+        The path to the runfile.
+    """
+    workspace = os.getenv("TEST_WORKSPACE", "_main")
+    runfile = runfiles.Rlocation(f"{workspace}/{path}")
+    if not runfile or not Path(runfile).exists():
+        raise FileNotFoundError(f"Failed to find runfile: {path}")
+    return Path(runfile)
+
+
+class SyntaxCheckTests(unittest.TestCase):
+    """Tests which run the process wrapper on the `tests` fixtures."""
+
+    def setUp(self) -> None:
+        runfiles = Runfiles.Create()
+        if not runfiles:
+            raise EnvironmentError("Failed to locate runfiles")
+        self.runfiles = runfiles
+        self.config = _rlocation(runfiles, "ansible/ansible.cfg")
+
+    def _run_wrapper(
+        self, package: str, playbook: Path, inventory: Path, output: Path
+    ) -> subprocess.CompletedProcess:
+        """Run the process wrapper in a new interpreter.
+
+        Args:
+            package: The package of the playbook.
+            playbook: The playbook to check.
+            inventory: The inventory `hosts` file.
+            output: The output file the wrapper produces on success.
+
+        Returns:
+            The results of the process wrapper.
+        """
+        args: List[str] = [
+            sys.executable,
+            wrapper.__file__,
+            f"--output={output}",
+            f"--package={package}",
+            f"--playbook={playbook}",
+            f"--inventory={inventory}",
+            f"--config_file={self.config}",
+        ]
+
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(sys.path)
+
+        return subprocess.run(
+            args,
+            cwd=output.parent,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            encoding="utf-8",
+            check=False,
+        )
+
+    def test_fixtures(self) -> None:
+        """Test that the syntax of all test playbooks is valid."""
+        for package in ("tests/simple", "tests/multi_role"):
+            with self.subTest(package=package), tempfile.TemporaryDirectory() as tmp:
+                output = Path(tmp) / "syntax_check"
+                result = self._run_wrapper(
+                    package=package,
+                    playbook=_rlocation(self.runfiles, f"{package}/site.yaml"),
+                    inventory=_rlocation(self.runfiles, f"{package}/hosts"),
+                    output=output,
+                )
+
+                self.assertEqual(result.returncode, 0, result.stdout)
+                self.assertTrue(output.exists())
+
+    def test_invalid_playbook(self) -> None:
+        """Test that errors from ansible are reported."""
+        with tempfile.TemporaryDirectory() as tmp:
+            playbook = Path(tmp) / "site.yaml"
+            playbook.write_text(
+                "- hosts: all\n  tasks:\n    - rules_ansible_missing_module: {}\n",
+                encoding="utf-8",
+            )
+            output = Path(tmp) / "syntax_check"
+            result = self._run_wrapper(
+                package="tests/invalid",
+                playbook=playbook,
+                inventory=_rlocation(self.runfiles, "tests/simple/hosts"),
+                output=output,
+            )
+
+            self.assertNotEqual(result.returncode, 0)
+            self.assertIn("rules_ansible_missing_module", result.stdout)
+            self.assertFalse(output.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
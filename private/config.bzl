@@ -0,0 +1,186 @@
+"""Rules for generating Ansible config files"""
+
+AnsibleConfigInfo = provider(
+    doc = "Information about an Ansible config file generated by `ansible_config`.",
+    fields = {
+        "config": "File: The generated `ansible.cfg` file.",
+        "forks": "int: The requested number of forks. `-1` indicates the number of available cores should be used.",
+    },
+)
+
+def _ini_section(name, settings):
+    """Render a section of an ini file.
+
+    Args:
+        name (str): The name of the section.
+        settings (dict[str, str]): The settings in the section.
+
+    Returns:
+        str: The rendered section or an empty string if there are no settings.
+    """
+    if not settings:
+        return ""
+
+    lines = ["[{}]".format(name)]
+    for key, value in settings.items():
+        lines.append("{} = {}".format(key, value))
+
+    return "\n".join(lines) + "\n"
+
+def _ansible_config_impl(ctx):
+    defaults = {}
+    if ctx.attr.forks > 0:
+        defaults["forks"] = str(ctx.attr.forks)
+    elif ctx.attr.forks < -1:
+        fail("`forks` must be `-1`, `0` or a positive number. Got `{}` for {}".format(
+            ctx.attr.forks,
+            ctx.label,
+        ))
+    if ctx.attr.gathering:
+        defaults["gathering"] = ctx.attr.gathering
+    if ctx.attr.fact_caching:
+        defaults["fact_caching"] = ctx.attr.fact_caching
+    if ctx.attr.fact_caching_connection:
+        defaults["fact_caching_connection"] = ctx.attr.fact_caching_connection
+    if ctx.attr.fact_caching_timeout:
+        defaults["fact_caching_timeout"] = str(ctx.attr.fact_caching_timeout)
+    if ctx.attr.internal_poll_interval:
+        defaults["internal_poll_interval"] = ctx.attr.internal_poll_interval
+    if ctx.attr.callbacks_enabled:
+        defaults["callbacks_enabled"] = ", ".join(ctx.attr.callbacks_enabled)
+
+    connection = {}
+    if ctx.attr.pipelining != -1:
+        connection["pipelining"] = "True" if ctx.attr.pipelining else "False"
+
+    ssh_connection = {}
+    if ctx.attr.ssh_control_persist:
+        ssh_connection["ssh_args"] = "-C -o ControlMaster=auto -o ControlPersist={}".format(
+            ctx.attr.ssh_control_persist,
+        )
+
+    content = "\n".join([
+        section
+        for section in [
+            _ini_section("defaults", defaults),
+            _ini_section("connection", connection),
+            _ini_section("ssh_connection", ssh_connection),
+        ]
+        if section
+    ])
+
+    config = ctx.actions.declare_file("{}.cfg".format(ctx.label.name))
+
+    if not ctx.file.base:
+        ctx.actions.write(
+            output = config,
+            content = content,
+        )
+    else:
+        overrides = ctx.actions.declare_file("{}.overrides.cfg".format(ctx.label.name))
+        ctx.actions.write(
+            output = overrides,
+            content = content,
+        )
+
+        args = ctx.actions.args()
+        args.add("--base", ctx.file.base)
+        args.add("--overrides", overrides)
+        args.add("--output", config)
+
+        ctx.actions.run(
+            executable = ctx.executable._merger,
+            inputs = [ctx.file.base, overrides],
+            outputs = [config],
+            arguments = [args],
+            mnemonic = "AnsibleConfig",
+            progress_message = "Generating ansible config {}".format(ctx.label),
+        )
+
+    return [
+        AnsibleConfigInfo(
+            config = config,
+            forks = ctx.attr.forks,
+        ),
+        DefaultInfo(
+            files = depset([config]),
+        ),
+    ]
+
+ansible_config = rule(
+    implementation = _ansible_config_impl,
+    doc = """\
+A rule for generating an `ansible.cfg` file from typed performance settings.
+
+The generated file can be passed to the `config` attribute of `ansible_playbook`
+or used as the value of the `@rules_ansible//ansible:config` flag. Only settings
+which are explicitly set are written, so any other values from `base` are preserved.
+
+```python
+load("@rules_ansible//ansible:defs.bzl", "ansible_config")
+
+ansible_config(
+    name = "ansible_cfg",
+    base = "ansible.cfg",
+    forks = -1,
+    gathering = "smart",
+    pipelining = 1,
+    ssh_control_persist = "60s",
+    fact_caching = "jsonfile",
+    fact_caching_connection = "/tmp/ansible_facts",
+    callbacks_enabled = ["ansible.posix.profile_tasks"],
+)
+```
+""",
+    attrs = {
+        "base": attr.label(
+            doc = "An optional `ansible.cfg` file which the settings of this rule are merged over.",
+            allow_single_file = True,
+        ),
+        "callbacks_enabled": attr.string_list(
+            doc = "Callback plugins to enable. E.g. `ansible.posix.profile_tasks` for profiling.",
+        ),
+        "fact_caching": attr.string(
+            doc = "The fact cache plugin to use. E.g. `memory`, `jsonfile` or `redis`.",
+        ),
+        "fact_caching_connection": attr.string(
+            doc = "The connection string or path for `fact_caching`.",
+        ),
+        "fact_caching_timeout": attr.int(
+            doc = "The expiration timeout in seconds for cached facts. `0` leaves the value unset.",
+        ),
+        "forks": attr.int(
+            doc = (
+                "The number of parallel processes to use. `0` leaves the value unset and `-1` " +
+                "uses the number of cores available to the machine running ansible."
+            ),
+            default = 0,
+        ),
+        "gathering": attr.string(
+            doc = "The fact gathering policy. An empty string leaves the value unset.",
+            values = ["", "implicit", "explicit", "smart"],
+            default = "",
+        ),
+        "internal_poll_interval": attr.string(
+            doc = "The interval in seconds at which ansible polls for task results. E.g. `0.001`.",
+        ),
+        "pipelining": attr.int(
+            doc = "Whether or not to enable connection pipelining. `-1` leaves the value unset.",
+            values = [-1, 0, 1],
+            default = -1,
+        ),
+        "ssh_control_persist": attr.string(
+            doc = (
+                "The `ControlPersist` duration for SSH multiplexing. E.g. `60s`. When set, this " +
+                "replaces any `ssh_args` from `base`. An empty string leaves `ssh_args` unset."
+            ),
+            default = "",
+        ),
+        "_merger": attr.label(
+            doc = "A utility for merging ansible config files.",
+            cfg = "exec",
+            executable = True,
+            default = Label("//private:ansible_config_merger"),
+        ),
+    },
+)
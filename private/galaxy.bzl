@@ -0,0 +1,224 @@
+"""Repository rules for vendoring Ansible Galaxy collections"""
+
+_BUILD_FILE_CONTENT = """\
+filegroup(
+    name = "collections",
+    srcs = glob(["ansible_collections/**"], allow_empty = True),
+    visibility = ["//visibility:public"],
+)
+"""
+
+def _unquote(value):
+    """Strip matching YAML quotes from a scalar value.
+
+    Args:
+        value (str): The raw scalar.
+
+    Returns:
+        str: The unquoted value.
+    """
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", "\""):
+        return value[1:-1]
+    return value
+
+def _strip_comment(line):
+    """Remove trailing YAML comments from a line.
+
+    Args:
+        line (str): A line of YAML.
+
+    Returns:
+        str: The line without comments.
+    """
+    if line.lstrip().startswith("#"):
+        return ""
+    idx = line.find(" #")
+    if idx >= 0:
+        return line[:idx]
+    return line
+
+def _parse_requirements(content, path):
+    """Parse the `collections` section of an `ansible-galaxy` requirements file.
+
+    Only the subset of YAML used by requirements files is supported: a
+    top level `collections` key containing a list of either collection
+    names or flat mappings of scalar values.
+
+    Args:
+        content (str): The content of the requirements file.
+        path (str): The path to the requirements file, used for error messages.
+
+    Returns:
+        list[dict[str, str]]: The parsed collection entries.
+    """
+    collections = []
+    section = None
+    current = None
+    for line in content.splitlines():
+        line = _strip_comment(line).rstrip()
+        text = line.strip()
+        if not text or text in ("---", "..."):
+            continue
+
+        if not line.startswith((" ", "-")):
+            key, sep, value = text.partition(":")
+            if not sep or value.strip() not in ("", "[]"):
+                fail("Unsupported top level entry in {}: `{}`".format(path, text))
+            section = key.strip()
+            current = None
+            continue
+
+        if section != "collections":
+            continue
+
+        if text.startswith("-"):
+            current = {}
+            collections.append(current)
+            text = text[1:].strip()
+            if not text:
+                continue
+            if ":" not in text:
+                current["name"] = _unquote(text)
+                continue
+
+        if current == None:
+            fail("Unexpected entry in {}: `{}`".format(path, text))
+
+        key, sep, value = text.partition(":")
+        if not sep:
+            fail("Unexpected entry in {}: `{}`".format(path, text))
+        current[key.strip()] = _unquote(value.strip())
+
+    return collections
+
+def _pinned_version(entry, path):
+    """Determine the exact version of a requirements entry.
+
+    Args:
+        entry (dict): A parsed requirements entry.
+        path (str): The path to the requirements file, used for error messages.
+
+    Returns:
+        str: The pinned version or `None` if no version was specified.
+    """
+    version = entry.get("version")
+    if not version:
+        return None
+    if version.startswith("=="):
+        version = version[len("=="):].strip()
+    for char in ("<", ">", "!", "=", "*", ",", " "):
+        if char in version:
+            fail("Collection `{}` in {} must be pinned to an exact version, not `{}`".format(
+                entry.get("name"),
+                path,
+                entry["version"],
+            ))
+    return version
+
+def _is_absolute(path):
+    return path.startswith("/") or (len(path) > 2 and path[1] == ":")
+
+def _ansible_galaxy_collections_repository_impl(repository_ctx):
+    requirements = repository_ctx.path(repository_ctx.attr.requirements)
+    requirements_dir = str(requirements.dirname)
+    content = repository_ctx.read(requirements)
+
+    mirror = repository_ctx.attr.mirror
+    if mirror and not _is_absolute(mirror):
+        mirror = "{}/{}".format(requirements_dir, mirror)
+
+    for entry in _parse_requirements(content, repository_ctx.attr.requirements):
+        entry_type = entry.get("type", "galaxy")
+        source = entry.get("source", "")
+        version = _pinned_version(entry, repository_ctx.attr.requirements)
+
+        if entry_type == "file" or source.endswith(".tar.gz"):
+            archive = source or entry.get("name", "")
+            if not _is_absolute(archive):
+                archive = "{}/{}".format(requirements_dir, archive)
+            fqcn = entry.get("name", "")
+            if not fqcn or "/" in fqcn or fqcn.endswith(".tar.gz"):
+                # Collection artifacts are named `<namespace>-<name>-<version>.tar.gz`.
+                namespace, _, remainder = archive.split("/")[-1].partition("-")
+                fqcn = "{}.{}".format(namespace, remainder.partition("-")[0])
+        elif entry_type == "galaxy":
+            fqcn = entry.get("name", "")
+            if not mirror:
+                fail("Collection `{}` in {} requires a `mirror` to be set".format(
+                    fqcn,
+                    repository_ctx.attr.requirements,
+                ))
+            if not version:
+                fail("Collection `{}` in {} must be pinned to an exact version".format(
+                    fqcn,
+                    repository_ctx.attr.requirements,
+                ))
+            archive = "{}/{}-{}.tar.gz".format(mirror, fqcn.replace(".", "-"), version)
+        else:
+            fail("Unsupported collection type `{}` for `{}` in {}".format(
+                entry_type,
+                entry.get("name"),
+                repository_ctx.attr.requirements,
+            ))
+
+        namespace, _, name = fqcn.partition(".")
+        if not namespace or not name:
+            fail("Unable to determine the collection name for `{}` in {}".format(
+                entry.get("name"),
+                repository_ctx.attr.requirements,
+            ))
+
+        archive = repository_ctx.path(archive)
+        if not archive.exists:
+            fail("Collection archive for `{}` does not exist: {}".format(fqcn, archive))
+        if hasattr(repository_ctx, "watch"):
+            repository_ctx.watch(archive)
+
+        output = "ansible_collections/{}/{}".format(namespace, name)
+        repository_ctx.extract(archive = archive, output = output)
+
+        manifest = json.decode(repository_ctx.read("{}/MANIFEST.json".format(output)))
+        info = manifest["collection_info"]
+        if info["namespace"] != namespace or info["name"] != name:
+            fail("Collection archive {} contains `{}.{}`, expected `{}`".format(
+                archive,
+                info["namespace"],
+                info["name"],
+                fqcn,
+            ))
+        if version and info["version"] != version:
+            fail("Collection archive {} contains `{}` version `{}`, expected `{}`".format(
+                archive,
+                fqcn,
+                info["version"],
+                version,
+            ))
+
+    repository_ctx.file("BUILD.bazel", _BUILD_FILE_CONTENT)
+
+ansible_galaxy_collections_repository = repository_rule(
+    implementation = _ansible_galaxy_collections_repository_impl,
+    doc = """\
+A repository rule for unpacking pinned Ansible Galaxy collections from local archives.
+
+Collections are unpacked into `ansible_collections/<namespace>/<name>` and exposed
+through the `:collections` target for use with the `collections` attribute of
+`ansible_toolchain`.
+""",
+    attrs = {
+        "mirror": attr.string(
+            doc = (
+                "A local directory containing `<namespace>-<name>-<version>.tar.gz` collection " +
+                "archives. Relative paths are resolved against the directory of `requirements`."
+            ),
+        ),
+        "requirements": attr.label(
+            doc = (
+                "An `ansible-galaxy` `requirements.yml` file. Entries must either be pinned " +
+                "to an exact version available in `mirror` or be `type: file` sources."
+            ),
+            allow_single_file = True,
+            mandatory = True,
+        ),
+    },
+)
@@ -14,14 +14,15 @@ def _ansible_lint_aspect_impl(target, ctx):
         return []
 
     playbook_info = target[AnsiblePlaybookInfo]
+    ansible_toolchain = ctx.toolchains[Label("//ansible:toolchain_type")]
 
     config = ctx.rule.file.config
 
     args = ctx.actions.args()
 
     inputs = depset(
-        [playbook_info.playbook, ctx.file._lint_config, config],
-        transitive = [playbook_info.inventory, playbook_info.roles],
+        [playbook_info.playbook, ctx.file._lint_config, config] + ctx.files._entrypoints,
+        transitive = [playbook_info.inventory, playbook_info.roles, ansible_toolchain.collections],
     )
 
     output = ctx.actions.declare_file(target.label.name + ".ansible_lint_check")
@@ -31,6 +32,22 @@ def _ansible_lint_aspect_impl(target, ctx):
     args.add("--playbook", target[AnsiblePlaybookInfo].playbook)
     args.add("--config_file", config)
     args.add("--lint_config_file", ctx.file._lint_config)
+    args.add("--entrypoints_dir", ctx.files._entrypoints[0].dirname)
+    for root in ansible_toolchain.collections_roots:
+        args.add("--collections_path", root.path)
+
+    # Memory profiling is requested through `--action_env=RULES_ANSIBLE_MEMPROFILE=...`.
+    outputs = [output]
+    env = {}
+    memprofiles = []
+    memprofile = ctx.configuration.default_shell_env.get("RULES_ANSIBLE_MEMPROFILE")
+    if memprofile:
+        memprofile_output = ctx.actions.declare_file(target.label.name + ".ansible_lint.memprofile.json")
+        args.add("--memprofile_output", memprofile_output)
+        outputs.append(memprofile_output)
+        memprofiles.append(memprofile_output)
+        env["RULES_ANSIBLE_MEMPROFILE"] = memprofile
+
     args.add("--")
     args.add("--show-relpath")
     args.add("--offline")
@@ -38,20 +55,27 @@ def _ansible_lint_aspect_impl(target, ctx):
     ctx.actions.run(
         executable = ctx.executable._process_wrapper,
         inputs = inputs,
-        outputs = [output],
+        outputs = outputs,
         arguments = [args],
+        env = env,
         mnemonic = "AnsibleLint",
         progress_message = "Ansible linting {}".format(target.label),
     )
 
     return [OutputGroupInfo(
         ansible_lint_checks = depset([output]),
+        ansible_lint_memprofiles = depset(memprofiles),
     )]
 
 ansible_lint_aspect = aspect(
     implementation = _ansible_lint_aspect_impl,
     doc = "An aspect for linting ansible targets.",
     attrs = {
+        "_entrypoints": attr.label(
+            doc = "Ansible executables required by `ansible-lint`.",
+            cfg = "exec",
+            default = Label("//private:ansible_lint_entrypoints"),
+        ),
         "_lint_config": attr.label(
             doc = "The ansible-lint config file to use",
             default = Label("//ansible:lint_config"),
@@ -64,6 +88,9 @@ ansible_lint_aspect = aspect(
             default = Label("//private:ansible_lint_process_wrapper"),
         ),
     },
+    toolchains = [
+        str(Label("//ansible:toolchain_type")),
+    ],
 )
 
 _AnsibleConfigFinderInfo = provider(
@@ -94,6 +121,7 @@ def _rlocationpath(file, workspace_name):
 
 def _ansible_lint_test_impl(ctx):
     venv_toolchain = py_venv_common.get_toolchain(ctx)
+    ansible_toolchain = ctx.toolchains[Label("//ansible:toolchain_type")]
     playbook_info = ctx.attr.playbook[AnsiblePlaybookInfo]
     config = ctx.attr.playbook[_AnsibleConfigFinderInfo].config
 
@@ -102,6 +130,10 @@ def _ansible_lint_test_impl(ctx):
     args.extend(["--package", ctx.attr.playbook.label.package])
     args.extend(["--config_file", _rlocationpath(config, ctx.workspace_name)])
     args.extend(["--lint_config_file", _rlocationpath(ctx.file.config, ctx.workspace_name)])
+    entrypoint = ctx.files._entrypoints[0]
+    args.extend(["--entrypoints_dir", _rlocationpath(entrypoint, ctx.workspace_name)[:-len("/" + entrypoint.basename)]])
+    for root in ansible_toolchain.collections_roots:
+        args.extend(["--collections_path", _rlocationpath(root, ctx.workspace_name)])
     args.append("--")
     args.append("--show-relpath")
     args.append("--offline")
@@ -113,8 +145,13 @@ def _ansible_lint_test_impl(ctx):
     )
 
     runfiles = ctx.runfiles(
-        files = [args_file, playbook_info.playbook, playbook_info.hosts, ctx.file.config, config],
-        transitive_files = depset(transitive = [playbook_info.inventory, playbook_info.roles, venv_toolchain.all_files]),
+        files = [args_file, playbook_info.playbook, playbook_info.hosts, ctx.file.config, config] + ctx.files._entrypoints,
+        transitive_files = depset(transitive = [
+            playbook_info.inventory,
+            playbook_info.roles,
+            ansible_toolchain.collections,
+            venv_toolchain.all_files,
+        ]),
     )
 
     script_info = get_process_wrapper_attr(ctx, "_process_wrapper")
@@ -148,11 +185,15 @@ ansible_lint_test = rule(
             allow_single_file = True,
         ),
         "playbook": attr.label(
-            doc = "The `ansible_playbook` target to lint.",
+            doc = "The `ansible_playbook` target to lint. The playbook's `config`, including `ansible_config` targets, is used for linting.",
             providers = [AnsiblePlaybookInfo],
             aspects = [_ansible_config_finder_aspect],
             mandatory = True,
         ),
+        "_entrypoints": attr.label(
+            doc = "Ansible executables required by `ansible-lint`.",
+            default = Label("//private:ansible_lint_entrypoints"),
+        ),
         "_process_wrapper": attr.label(
             doc = "A process wrapper for running `ansible-lint`.",
             cfg = "exec",
@@ -164,5 +205,95 @@ ansible_lint_test = rule(
     test = True,
     toolchains = [
         py_venv_common.TOOLCHAIN_TYPE,
+        str(Label("//ansible:toolchain_type")),
     ],
 )
+
+_ENTRYPOINT_TEMPLATE = """\
+#!/bin/sh
+# Generated by `ansible_entrypoints`. Runs the python entrypoint `{script}`.
+python="${{ANSIBLE_BZL_PYTHON:?ANSIBLE_BZL_PYTHON must be set to the interpreter to run ansible with}}"
+if [ -n "${{RULES_ANSIBLE_MEMPROFILE_REPORT_DIR:-}}" ]; then
+    exec "${{python}}" "${{0%/*}}/_scripts/{memprofile}" "${{0%/*}}/_scripts/{name}" "$@"
+fi
+exec "${{python}}" "${{0%/*}}/_scripts/{name}" "$@"
+"""
+
+def _copy_script(ctx, src, name):
+    """Copy a python script into the `_scripts` directory of `ansible_entrypoints`.
+
+    The copy must not be a symlink as python adds the resolved directory of a
+    script to `sys.path` and `scripts/ansible.py` would then shadow the `ansible`
+    package.
+
+    Args:
+        ctx (ctx): The rule's context object.
+        src (File): The script to copy.
+        name (str): The name of the copy.
+
+    Returns:
+        File: The copied script.
+    """
+    script = ctx.actions.declare_file("{}/_scripts/{}".format(ctx.label.name, name))
+    ctx.actions.expand_template(
+        template = src,
+        output = script,
+        substitutions = {},
+    )
+    return script
+
+def _ansible_entrypoints_impl(ctx):
+    executables = []
+
+    # Entrypoints run through the memory profiling shim when reports were requested.
+    memprofile = _copy_script(ctx, ctx.file._memprofile, ctx.file._memprofile.basename)
+    scripts = [memprofile]
+
+    for target, name in ctx.attr.entrypoints.items():
+        files = target[DefaultInfo].files.to_list()
+        if len(files) != 1:
+            fail("Entrypoint `{}` must produce a single file for {}".format(target.label, ctx.label))
+
+        # The python script is copied next to the executable so it can be located
+        # without runfiles.
+        scripts.append(_copy_script(ctx, files[0], name))
+
+        executable = ctx.actions.declare_file("{}/{}".format(ctx.label.name, name))
+        ctx.actions.write(
+            output = executable,
+            content = _ENTRYPOINT_TEMPLATE.format(
+                memprofile = memprofile.basename,
+                name = name,
+                script = files[0].short_path,
+            ),
+            is_executable = True,
+        )
+        executables.append(executable)
+
+    return [DefaultInfo(
+        files = depset(executables + scripts),
+        runfiles = ctx.runfiles(files = executables + scripts),
+    )]
+
+ansible_entrypoints = rule(
+    implementation = _ansible_entrypoints_impl,
+    doc = """\
+A rule for producing a directory of ansible executables for use in `PATH`.
+
+Each executable is a shell script which runs its python entrypoint with the
+interpreter defined by `ANSIBLE_BZL_PYTHON`. The interpreter is only known at
+runtime as `rules_venv` materializes the virtual environment when a binary starts.
+""",
+    attrs = {
+        "entrypoints": attr.label_keyed_string_dict(
+            doc = "A mapping of python entrypoints to the name of the executable to create.",
+            allow_files = [".py"],
+            mandatory = True,
+        ),
+        "_memprofile": attr.label(
+            doc = "A shim for recording the memory usage of entrypoints.",
+            allow_single_file = True,
+            default = Label("//private:ansible_memprofile.py"),
+        ),
+    },
+)
@@ -0,0 +1,67 @@
+"""Rules for syntax checking ansible playbooks"""
+
+load(":ansible.bzl", "AnsiblePlaybookInfo")
+
+def _ansible_syntax_check_aspect_impl(target, ctx):
+    if AnsiblePlaybookInfo not in target:
+        return []
+
+    playbook_info = target[AnsiblePlaybookInfo]
+    ansible_toolchain = ctx.toolchains[Label("//ansible:toolchain_type")]
+
+    config = ctx.rule.file.config
+
+    inputs = depset(
+        [playbook_info.playbook, playbook_info.hosts, config],
+        transitive = [playbook_info.inventory, playbook_info.roles, ansible_toolchain.collections],
+    )
+
+    output = ctx.actions.declare_file(target.label.name + ".ansible_syntax_check")
+
+    args = ctx.actions.args()
+    args.add("--output", output)
+    args.add("--package", target.label.package)
+    args.add("--playbook", playbook_info.playbook)
+    args.add("--inventory", playbook_info.hosts)
+    args.add("--config_file", config)
+    for root in ansible_toolchain.collections_roots:
+        args.add("--collections_path", root.path)
+
+    ctx.actions.run(
+        executable = ctx.executable._process_wrapper,
+        inputs = inputs,
+        outputs = [output],
+        arguments = [args],
+        mnemonic = "AnsibleSyntaxCheck",
+        progress_message = "Ansible syntax checking {}".format(target.label),
+    )
+
+    return [OutputGroupInfo(
+        ansible_syntax_checks = depset([output]),
+    )]
+
+ansible_syntax_check_aspect = aspect(
+    implementation = _ansible_syntax_check_aspect_impl,
+    doc = """\
+An aspect for running `ansible-playbook --syntax-check` on `ansible_playbook` targets.
+
+The check runs in a sandboxed action whose only inputs are the staged playbook, roles,
+inventory and config, making results remote cacheable. Enable it with:
+
+```text
+build --aspects=@rules_ansible//ansible:defs.bzl%ansible_syntax_check_aspect
+build --output_groups=+ansible_syntax_checks
+```
+""",
+    attrs = {
+        "_process_wrapper": attr.label(
+            doc = "A process wrapper for running `ansible-playbook --syntax-check`.",
+            cfg = "exec",
+            executable = True,
+            default = Label("//private:ansible_syntax_check_process_wrapper"),
+        ),
+    },
+    toolchains = [
+        str(Label("//ansible:toolchain_type")),
+    ],
+)
@@ -86,13 +86,15 @@ def generate_process_wrapper(
         *,
         ctx,
         script_info,
-        runfiles):
+        runfiles,
+        deps = []):
     """_summary_
 
     Args:
         ctx (_type_): _description_
         script_info (_type_): _description_
         runfiles (_type_): _description_
+        deps (list[Target], optional): Additional `py_library` targets to make importable.
 
     Returns:
         _type_: _description_
@@ -100,7 +102,7 @@ def generate_process_wrapper(
     venv_toolchain = py_venv_common.get_toolchain(ctx, cfg = "exec")
 
     process_wrapper_main = script_info.main
-    deps = [script_info.target]
+    deps = [script_info.target] + deps
     srcs = [script_info.main]
 
     dep_info = py_venv_common.create_dep_info(